@@ -0,0 +1,418 @@
+"""Load test: the FastAPI app in-process under a concurrent mixed workload.
+
+Run from the backend directory, against a local mongod:
+
+    python benchmarks/load_bench.py --mongo-url mongodb://localhost:27017 \\
+        --parties 1000 --products 500 --orders 100000 --transactions 100000 \\
+        --concurrency 32 --duration 60 --output results.json
+
+or against an in-memory stand-in (needs mongomock-motor, which lacks
+$unionWith, so the statement workload is skipped and numbers are only
+useful for comparing code paths, not for capacity planning):
+
+    python benchmarks/load_bench.py --in-memory --orders 10000
+
+The benchmark database (--db-name, default "loadbench") is dropped and
+seeded with synthetic parties, products, orders with their material
+transactions, and financial transactions, unless --no-seed reuses it.
+Requests go through httpx's ASGI transport, so routing, validation and
+serialization are all measured, without a network hop. Results (per
+operation count, errors, RPS and p50/p95/p99 latency) are printed and, with
+--output, written as JSON so runs can be compared.
+
+--outbox-mode async runs POST /api/orders with its side effects deferred to
+the outbox workers (see outbox.py); compare its create p99 with a sync run,
+e.g. with --mix create=100. The time the workers then take to empty the
+outbox is reported as outbox_drain_seconds.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SEED_BATCH_SIZE = 10000
+OPEN_SHARE = 0.3
+REORDER_WINDOW = 20
+DEFAULT_MIX = "create=30,reorder=10,list=40,statement=20"
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def random_lines(rng: random.Random, products: list) -> list:
+    return [
+        {
+            "product_id": str(p["_id"]),
+            "product_name": p["name"],
+            "quantity": float(rng.randint(1, 20)),
+            "price": p["price"],
+            "weight": p["weight"],
+        }
+        for p in rng.sample(products, rng.randint(1, min(5, len(products))))
+    ]
+
+
+async def insert_batches(collection, docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= SEED_BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def seed(db, args, rng: random.Random) -> dict:
+    """Drop and fill the benchmark database; returns counts and timing."""
+    start = time.perf_counter()
+    for name in ("parties", "products", "orders", "material_transactions",
+                 "financial_transactions", "counters"):
+        await db[name].drop()
+
+    now = datetime.utcnow()
+    products = [
+        {
+            "_id": ObjectId(),
+            "name": f"Product {i}",
+            "price": round(rng.uniform(10, 500), 2),
+            "weight": round(rng.uniform(0.5, 5), 2),
+            "description": "",
+        }
+        for i in range(args.products)
+    ]
+    await insert_batches(db.products, products)
+
+    parties = [
+        {"_id": ObjectId(), "name": f"Party {i}", "contact": "", "balance": 0.0,
+         "created_at": now - timedelta(days=365)}
+        for i in range(args.parties)
+    ]
+    balances = {p["_id"]: 0.0 for p in parties}
+    next_priority = {p["_id"]: 0 for p in parties}
+
+    def orders_and_transactions():
+        for _ in range(args.orders):
+            party = rng.choice(parties)
+            lines = random_lines(rng, products)
+            created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            order_type = rng.choice(("sale", "purchase"))
+            total_price = sum(line["quantity"] * line["price"] for line in lines)
+            if rng.random() < OPEN_SHARE:
+                status = rng.choice(("start", "inprocess"))
+                priority = next_priority[party["_id"]]
+                next_priority[party["_id"]] += 1
+            else:
+                status, priority = "completed", 9999
+            order_id = ObjectId()
+            amount = total_price if order_type == "sale" else -total_price
+            balances[party["_id"]] += amount
+            order = {
+                "_id": order_id,
+                "party_id": str(party["_id"]),
+                "party_name": party["name"],
+                "order_type": order_type,
+                "products": lines,
+                "total_price": total_price,
+                "total_weight": sum(line["quantity"] * line["weight"] for line in lines),
+                "status": status,
+                "priority": priority,
+                "reference_order_id": None,
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+            transaction = {
+                "party_id": order["party_id"],
+                "party_name": party["name"],
+                "order_id": str(order_id),
+                "order_type": order_type,
+                "amount": amount,
+                "description": f"{order_type.capitalize()} order created",
+                "created_at": created_at,
+            }
+            yield order, transaction
+
+    # Orders and their material transactions are written batch by batch, so
+    # memory stays flat at any scale
+    orders, transactions = [], []
+    for order, transaction in orders_and_transactions():
+        orders.append(order)
+        transactions.append(transaction)
+        if len(orders) >= SEED_BATCH_SIZE:
+            await insert_batches(db.orders, orders)
+            await insert_batches(db.material_transactions, transactions)
+            orders, transactions = [], []
+    await insert_batches(db.orders, orders)
+    await insert_batches(db.material_transactions, transactions)
+
+    def financial_transactions():
+        for _ in range(args.transactions):
+            party = rng.choice(parties)
+            amount = round(rng.uniform(100, 10000), 2)
+            payment_type = rng.choice(("payment", "receipt"))
+            balances[party["_id"]] += -amount if payment_type == "payment" else amount
+            yield {
+                "party_id": str(party["_id"]),
+                "party_name": party["name"],
+                "amount": amount,
+                "payment_type": payment_type,
+                "payment_method": "cash",
+                "description": "",
+                "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+            }
+
+    await insert_batches(db.financial_transactions, financial_transactions())
+
+    for party in parties:
+        party["balance"] = balances[party["_id"]]
+    await insert_batches(db.parties, parties)
+
+    return {
+        "parties": args.parties,
+        "products": args.products,
+        "orders": args.orders,
+        "financial_transactions": args.transactions,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+class Workload:
+    def __init__(self, http, db, party_ids: list, products: list, rng: random.Random):
+        self.http = http
+        self.db = db
+        self.party_ids = party_ids
+        self.products = products
+        self.rng = rng
+
+    async def create(self):
+        return await self.http.post("/api/orders", json={
+            "party_id": self.rng.choice(self.party_ids),
+            "order_type": self.rng.choice(("sale", "purchase")),
+            "products": random_lines(self.rng, self.products),
+        })
+
+    async def reorder(self):
+        # Picking the orders to shuffle is setup, not part of the measured call
+        party_id = self.rng.choice(self.party_ids)
+        open_orders = await self.db.orders.find(
+            {"party_id": party_id, "status": {"$in": ["start", "inprocess"]}}, {"_id": 1}
+        ).sort("priority", 1).limit(REORDER_WINDOW).to_list(None)
+        order_ids = [str(o["_id"]) for o in open_orders]
+        self.rng.shuffle(order_ids)
+        return lambda: self.http.post("/api/orders/reorder", json=order_ids)
+
+    async def list(self):
+        return await self.http.get(
+            "/api/orders", params={"party_id": self.rng.choice(self.party_ids), "limit": 100}
+        )
+
+    async def statement(self):
+        return await self.http.get(
+            f"/api/parties/{self.rng.choice(self.party_ids)}/statement", params={"limit": 100}
+        )
+
+
+OPERATIONS = ("create", "reorder", "list", "statement")
+
+
+async def run_workload(workload: Workload, mix: dict, args) -> dict:
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.perf_counter() + args.duration
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while time.perf_counter() < deadline:
+            if args.requests:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            name = workload.rng.choices(names, weights)[0]
+            op = getattr(workload, name)
+            start = time.perf_counter()
+            result = await op()
+            if callable(result):
+                start = time.perf_counter()
+                result = await result()
+            latencies[name].append(time.perf_counter() - start)
+            if result.status_code >= 400:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    operations = {}
+    for name in names:
+        values = sorted(latencies[name])
+        operations[name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+    total = sum(op["count"] for op in operations.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(op["errors"] for op in operations.values()),
+        "rps": round(total / elapsed, 2),
+        "operations": operations,
+    }
+
+
+def print_report(result: dict):
+    workload = result["workload"]
+    print(f"{workload['requests']} requests in {workload['seconds']}s: "
+          f"{workload['rps']} req/s, {workload['errors']} errors")
+    print(f"{'operation':>10} {'count':>8} {'errors':>7} {'rps':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, op in workload["operations"].items():
+        print(f"{name:>10} {op['count']:>8} {op['errors']:>7} {op['rps']:>9.1f} "
+              f"{op['p50_ms']:>9.2f} {op['p95_ms']:>9.2f} {op['p99_ms']:>9.2f}")
+    if "outbox_drain_seconds" in result:
+        print(f"outbox drained {result['outbox_drain_seconds']}s after the last request")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="local mongod, e.g. mongodb://localhost:27017")
+    target.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--db-name", default="loadbench")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the existing benchmark database")
+    parser.add_argument("--parties", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run the workload")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--outbox-mode", choices=("sync", "async"), default="sync",
+                        help="apply order side effects inline or through the outbox workers")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    if args.requests:
+        args.duration = float("inf")
+
+    mix = parse_mix(args.mix)
+    if args.in_memory and mix.get("statement"):
+        print("note: the in-memory stand-in has no $unionWith; skipping the statement workload")
+        mix["statement"] = 0
+
+    # The server reads its settings at import time
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["OUTBOX_MODE"] = args.outbox_mode
+    import httpx
+    import server
+    # One log line per request would skew the numbers
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    rng = random.Random(args.random_seed)
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+        lifespan = None
+        if args.outbox_mode == "async":
+            await server.outbox.start(server.db)
+    else:
+        lifespan = server.lifespan(server.app)
+        await lifespan.__aenter__()
+
+    try:
+        db = server.db
+        seeded = None
+        if not args.no_seed:
+            print(f"seeding {args.parties} parties, {args.products} products, "
+                  f"{args.orders} orders, {args.transactions} financial transactions")
+            seeded = await seed(db, args, rng)
+            print(f"seeded in {seeded['seconds']}s")
+            if lifespan is not None:
+                # Dropping the collections dropped their indexes too
+                await server.ensure_indexes(db)
+
+        party_ids = [str(p["_id"]) for p in await db.parties.find({}, {"_id": 1}).to_list(None)]
+        products = await db.products.find({}, {"name": 1, "price": 1, "weight": 1}).to_list(None)
+        if not party_ids or not products:
+            raise SystemExit("The benchmark database is empty; run without --no-seed first")
+
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadbench") as http:
+            workload = Workload(http, db, party_ids, products, rng)
+            result = {
+                "started_at": datetime.utcnow().isoformat(),
+                "backend": "in-memory" if args.in_memory else "mongod",
+                "python": platform.python_version(),
+                "config": {
+                    "db_name": args.db_name,
+                    "concurrency": args.concurrency,
+                    "duration": None if args.requests else args.duration,
+                    "requests": args.requests or None,
+                    "mix": mix,
+                    "outbox_mode": args.outbox_mode,
+                    "random_seed": args.random_seed,
+                },
+                "seed": seeded,
+                "workload": await run_workload(workload, mix, args),
+            }
+        if args.outbox_mode == "async":
+            start = time.perf_counter()
+            while await db.orders.find_one({"outbox": {"$exists": True}}, {"_id": 1}):
+                await asyncio.sleep(0.01)
+            result["outbox_drain_seconds"] = round(time.perf_counter() - start, 3)
+    finally:
+        if lifespan is None:
+            await server.outbox.stop()
+        else:
+            await lifespan.__aexit__(None, None, None)
+
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Microbenchmark: cost of request and MongoDB command metrics.
+
+Run from the backend directory:
+
+    python benchmarks/metrics_bench.py [--requests 20000] [--commands 200000] [--repeat 5]
+
+Requests are driven straight through the ASGI interface of a one-route app,
+with and without RequestMetricsMiddleware, so the difference is the
+middleware alone. Commands feed synthetic started/succeeded events to
+CommandMetrics the way pymongo does for every command.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI  # noqa: E402
+
+from metrics import CommandMetrics, MetricsRegistry, RequestMetricsMiddleware  # noqa: E402
+
+
+def make_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/orders/{order_id}")
+    async def get_order(order_id: str):
+        return {"id": order_id}
+
+    if with_metrics:
+        app.add_middleware(RequestMetricsMiddleware, registry=MetricsRegistry())
+    return app
+
+
+async def drive(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(count):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": f"/api/orders/{i}",
+            "raw_path": f"/api/orders/{i}".encode(), "root_path": "",
+            "query_string": b"", "headers": [], "server": ("bench", 80),
+            "client": ("bench", 1234),
+        }
+        await app(scope, receive, send)
+    return time.perf_counter() - start
+
+
+def feed_commands(count: int) -> float:
+    listener = CommandMetrics(MetricsRegistry())
+    reply = {"cursor": {"firstBatch": [{}] * 10}, "ok": 1}
+    connection = ("localhost", 27017)
+    start = time.perf_counter()
+    for i in range(count):
+        listener.started(SimpleNamespace(
+            command={"find": "orders"}, command_name="find",
+            request_id=i, connection_id=connection,
+        ))
+        listener.succeeded(SimpleNamespace(
+            command_name="find", request_id=i, connection_id=connection,
+            duration_micros=800, reply=reply,
+        ))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--commands", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    plain, instrumented = make_app(False), make_app(True)
+    # Build the middleware stacks before timing
+    await drive(plain, 100)
+    await drive(instrumented, 100)
+    base = min([await drive(plain, args.requests) for _ in range(args.repeat)])
+    timed = min([await drive(instrumented, args.requests) for _ in range(args.repeat)])
+    per_base = base / args.requests * 1e6
+    per_timed = timed / args.requests * 1e6
+    print(f"request without metrics: {per_base:8.2f} us")
+    print(f"request with metrics:    {per_timed:8.2f} us  "
+          f"(+{per_timed - per_base:.2f} us, {(timed / base - 1) * 100:.1f}%)")
+
+    commands = min(feed_commands(args.commands) for _ in range(args.repeat))
+    print(f"command listener:        {commands / args.commands * 1e6:8.2f} us per command")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""Microbenchmark: orders list payload with sparse fieldsets and compression.
+
+Run from the backend directory:
+
+    python benchmarks/payload_bench.py [--size 1000] [--fields party_name,total_price,status] [--repeat 5]
+
+Times what GET /api/orders does after the query returns (page shaping,
+orjson encoding, then compression) for the full document and for a sparse
+fieldset, and reports the bytes that go on the wire for each encoding. The
+Mongo side saves too, since the projection leaves products on the server,
+but that needs a real mongod to measure.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import server  # noqa: E402
+from compression import CompressionMiddleware, brotli  # noqa: E402
+from serialization import FastJSONResponse, parse_fields  # noqa: E402
+from serialization_bench import make_orders  # noqa: E402
+
+
+def project(docs: list, projection: dict) -> list:
+    # What the Mongo projection would have returned
+    return [{"_id": d["_id"], **{k: d[k] for k in projection if k in d}} for d in docs]
+
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--fields", default="party_name,total_price,status")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_orders(args.size)
+    selected = parse_fields(server.Order, args.fields)
+    variants = {
+        "full": (project(docs, server.read_projection(server.Order, None)), None),
+        "sparse": (project(docs, server.read_projection(server.Order, selected, "priority")), selected),
+    }
+    compressor = CompressionMiddleware(app=None)
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+    print(f"{args.size} orders, sparse fields: {args.fields}")
+    print(f"{'variant':>8} {'encoding':>9} {'bytes':>10} {'ms':>8}")
+    for name, (page_docs, fields) in variants.items():
+        def render():
+            return FastJSONResponse(server.build_page(server.Order, page_docs, None, fields)).body
+        body = render()
+        for encoding in encodings:
+            if encoding == "identity":
+                size, elapsed = len(body), best_time(render, args.repeat)
+            else:
+                size = len(compressor.compress(body, encoding))
+                elapsed = best_time(lambda: compressor.compress(render(), encoding), args.repeat)
+            print(f"{name:>8} {encoding:>9} {size:>10} {elapsed * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
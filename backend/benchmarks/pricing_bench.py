@@ -0,0 +1,141 @@
+"""Cost of server-side order pricing: the catalog lookup and the totals.
+
+Run from the backend directory:
+
+    python benchmarks/pricing_bench.py --in-memory [--products 1000] [--lines 200] [--repeat 20]
+    python benchmarks/pricing_bench.py --mongo-url mongodb://localhost:27017 ...
+
+Lookup: resolving the products of --lines order lines with one find_one per
+line, with the single $in query of load_catalog, and from a warm product
+cache. Totals: time per line of order_totals' single loop against two
+sum() passes and, when numpy is installed, copying the lines into arrays and
+taking dot products, at growing line counts.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache import TTLCache  # noqa: E402
+from pricing import CATALOG_PROJECTION, load_catalog, order_totals  # noqa: E402
+
+try:
+    import numpy
+except ImportError:  # the numpy column is left out
+    numpy = None
+
+LINE_COUNTS = (1, 8, 32, 64, 128, 512, 4096, 32768)
+
+
+async def best_async(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def best_sync(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def lookup_bench(db, args, rng: random.Random):
+    await db.products.drop()
+    result = await db.products.insert_many([
+        {"name": f"Product {i}", "price": rng.uniform(1, 500), "weight": rng.uniform(0.1, 50)}
+        for i in range(args.products)
+    ])
+    product_ids = [str(oid) for oid in rng.choices(result.inserted_ids, k=args.lines)]
+    from bson import ObjectId
+
+    async def per_line():
+        for product_id in product_ids:
+            await db.products.find_one({"_id": ObjectId(product_id)}, CATALOG_PROJECTION)
+
+    def cold():
+        return load_catalog(db, product_ids, TTLCache(maxsize=args.products, ttl=300))
+
+    warm_cache = TTLCache(maxsize=args.products, ttl=300)
+    await load_catalog(db, product_ids, warm_cache)
+
+    print(f"catalog lookup for {args.lines} lines over {args.products} products")
+    for name, fn in (
+        ("find_one per line", per_line),
+        ("one $in query", cold),
+        ("warm cache", lambda: load_catalog(db, product_ids, warm_cache)),
+    ):
+        elapsed = await best_async(fn, args.repeat)
+        print(f"  {name:>18}: {elapsed * 1000:>8.3f} ms")
+
+
+def two_sums(lines):
+    return (sum(l["quantity"] * l["price"] for l in lines),
+            sum(l["quantity"] * l["weight"] for l in lines))
+
+
+def numpy_dot(lines):
+    columns = [
+        numpy.fromiter(map(itemgetter(field), lines), dtype=float, count=len(lines))
+        for field in ("quantity", "price", "weight")
+    ]
+    return float(columns[0] @ columns[1]), float(columns[0] @ columns[2])
+
+
+def totals_bench(args, rng: random.Random):
+    approaches = {"loop": lambda lines: order_totals([lines]), "two sums": two_sums}
+    if numpy is not None:
+        approaches["numpy dot"] = numpy_dot
+    print("order totals, ns per line")
+    print(f"{'lines':>8}" + "".join(f" {name:>10}" for name in approaches))
+    for count in LINE_COUNTS:
+        lines = [
+            {"quantity": float(rng.randint(1, 20)), "price": rng.uniform(1, 500), "weight": rng.uniform(0.1, 50)}
+            for _ in range(count)
+        ]
+        timings = [best_sync(lambda: fn(lines), args.repeat) / count for fn in approaches.values()]
+        print(f"{count:>8}" + "".join(f" {t * 1e9:>10.1f}" for t in timings))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="local mongod, e.g. mongodb://localhost:27017")
+    target.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--db-name", default="pricingbench")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--random-seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url or os.environ["MONGO_URL"])
+    try:
+        await lookup_bench(client[args.db_name], args, rng)
+    finally:
+        client.close()
+    totals_bench(args, rng)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""Latency of the typeahead search endpoints at scale.
+
+Run from the backend directory, against a local mongod:
+
+    python benchmarks/search_bench.py --mongo-url mongodb://localhost:27017 \\
+        [--parties 100000] [--queries 2000] [--output search.json]
+
+or with --in-memory (mongomock-motor has no indexes, so every query scans
+the collection; use a smaller --parties there). The benchmark database
+(--db-name, default "searchbench") is dropped and seeded with synthetic
+party names, then GET /api/parties/search is timed for random 1-4 letter
+prefixes of real name words, one request at a time, through httpx's ASGI
+transport.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from load_bench import percentile  # noqa: E402
+from search import search_terms  # noqa: E402
+
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Amit", "Anita", "Arjun", "Deepak", "Divya", "Farhan", "Gita", "Harish",
+    "Isha", "Karan", "Kavya", "Manoj", "Meera", "Neha", "Nikhil", "Pooja", "Rahul", "Ravi",
+    "Rohan", "Sanjay", "Sneha", "Sunil", "Tanvi", "Varun", "Vikram", "Yash", "Zoya", "Élodie",
+]
+LAST_NAMES = [
+    "Agarwal", "Bansal", "Chopra", "Desai", "Gupta", "Iyer", "Jain", "Kapoor", "Khan", "Kumar",
+    "Mehta", "Nair", "Patel", "Rao", "Reddy", "Saini", "Shah", "Sharma", "Singh", "Verma",
+]
+SUFFIXES = ["", "", "", "Traders", "& Sons", "Enterprises", "Metals", "Industries"]
+
+
+def party_name(rng: random.Random) -> str:
+    parts = [rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice(SUFFIXES)]
+    return " ".join(p for p in parts if p)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="local mongod, e.g. mongodb://localhost:27017")
+    target.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--db-name", default="searchbench")
+    parser.add_argument("--parties", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = args.db_name
+    import httpx
+    import server
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    rng = random.Random(args.random_seed)
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+        lifespan = None
+    else:
+        lifespan = server.lifespan(server.app)
+        await lifespan.__aenter__()
+
+    try:
+        db = server.db
+        await db.parties.drop()
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(args.parties):
+            name = party_name(rng)
+            batch.append({
+                "name": name, "contact": "", "balance": 0.0, "created_at": now,
+                "name_terms": search_terms(name),
+            })
+            if len(batch) >= 10000:
+                await db.parties.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.parties.insert_many(batch, ordered=False)
+        if lifespan is not None:
+            await server.ensure_indexes(db)
+        print(f"seeded {args.parties} parties in {time.perf_counter() - start:.1f}s")
+
+        words = FIRST_NAMES + LAST_NAMES + [s.split()[-1] for s in SUFFIXES if s]
+        latencies = {length: [] for length in range(1, 5)}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://searchbench") as http:
+            for i in range(args.queries):
+                length = i % 4 + 1
+                q = rng.choice(words)[:length]
+                start = time.perf_counter()
+                response = await http.get("/api/parties/search", params={"q": q, "limit": args.limit})
+                latencies[length].append(time.perf_counter() - start)
+                response.raise_for_status()
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    results = {}
+    print(f"{'prefix':>7} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for length, values in latencies.items():
+        values.sort()
+        results[length] = {
+            "queries": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+        r = results[length]
+        print(f"{length:>7} {r['queries']:>8} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "backend": "in-memory" if args.in_memory else "mongod",
+            "parties": args.parties,
+            "limit": args.limit,
+            "prefix_lengths": results,
+        }, indent=2))
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Microbenchmark: model-validated list responses vs. the fast orjson path.
+
+Run from the backend directory:
+
+    python benchmarks/serialization_bench.py [--sizes 100 1000 10000] [--repeat 5]
+
+The "model" path is what a list handler did before fast mode: object_id_to_str,
+Order(**doc) per document, then FastAPI's own response_model validation and
+JSON encoding. The "fast" path is build_page/respond with FAST_RESPONSES on.
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+from serialization import FastJSONResponse, fast_page  # noqa: E402
+
+
+def make_orders(count: int, lines: int = 5) -> list:
+    now = datetime.utcnow()
+    party_id = str(ObjectId())
+    orders = []
+    for i in range(count):
+        products = [
+            {
+                "product_id": str(ObjectId()),
+                "product_name": f"Product {j}",
+                "quantity": float(random.randint(1, 20)),
+                "price": round(random.uniform(10, 500), 2),
+                "weight": round(random.uniform(0.5, 5), 2),
+            }
+            for j in range(lines)
+        ]
+        orders.append({
+            "_id": ObjectId(),
+            "party_id": party_id,
+            "party_name": "Benchmark Party",
+            "order_type": "sale" if i % 2 else "purchase",
+            "products": products,
+            "total_price": sum(p["quantity"] * p["price"] for p in products),
+            "total_weight": sum(p["quantity"] * p["weight"] for p in products),
+            "status": "start",
+            "priority": i,
+            "reference_order_id": None,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+        })
+    return orders
+
+
+async def model_path(field, docs: list) -> bytes:
+    page = server.Page[server.Order](
+        items=[server.Order(**server.object_id_to_str(d)) for d in docs],
+        next_cursor=None,
+    )
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+async def fast_path(field, docs: list) -> bytes:
+    return FastJSONResponse(fast_page(docs, None, server.DEFAULTS[server.Order])).body
+
+
+async def best_time(path, field, docs: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # object_id_to_str mutates its input, so every run gets fresh documents
+        batch = copy.deepcopy(docs)
+        start = time.perf_counter()
+        await path(field, batch)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    field = create_response_field(name="response", type_=server.Page[server.Order])
+    print(f"{'orders':>8} {'model ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        docs = make_orders(size)
+        model = await best_time(model_path, field, docs, args.repeat)
+        fast = await best_time(fast_path, field, docs, args.repeat)
+        print(f"{size:>8} {model * 1000:>10.2f} {fast * 1000:>10.2f} {model / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
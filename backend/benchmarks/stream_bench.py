@@ -0,0 +1,105 @@
+"""Fan-out of /api/stream events to many subscribers.
+
+Run from the backend directory:
+
+    python benchmarks/stream_bench.py [--subscribers 100,500,1000] [--events 500] [--rate 200]
+
+For each subscriber count, that many SSE consumers (the generator behind
+GET /api/stream) subscribe to one party and --events order events are
+published at --rate per second. Reports the time publish() takes on the
+write path, and the delay from publish to delivery: per delivery, and until
+the last subscriber has the event. Socket writes are not included; with
+real clients they happen concurrently on the event loop.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from events import EventBroker, make_event, sse_frames  # noqa: E402
+from load_bench import percentile  # noqa: E402
+
+PARTY_ID = "64b000000000000000000001"
+
+
+async def consume(broker: EventBroker, events: int, started: asyncio.Event, received: list):
+    frames = sse_frames(broker, PARTY_ID)
+    await frames.__anext__()  # subscribed
+    started.set()
+    try:
+        while len(received) < events:
+            # A chunk carries every frame queued since the last one
+            chunk = await frames.__anext__()
+            received.extend([time.perf_counter()] * chunk.count(b"\n\n"))
+    finally:
+        await frames.aclose()
+
+
+async def run(subscribers: int, events: int, rate: float) -> dict:
+    broker = EventBroker()
+    receipts = [[] for _ in range(subscribers)]
+    consumers = []
+    for received in receipts:
+        started = asyncio.Event()
+        consumers.append(asyncio.create_task(consume(broker, events, started, received)))
+        await started.wait()
+
+    published, publish_cost = [], []
+    for i in range(events):
+        event = make_event("orders", "updated", i, PARTY_ID, {
+            "status": "inprocess", "priority": i, "updated_at": datetime.utcnow(),
+        })
+        start = time.perf_counter()
+        broker.publish(event)
+        publish_cost.append(time.perf_counter() - start)
+        published.append(start)
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*consumers)
+
+    deliveries = sorted(
+        received[i] - published[i] for received in receipts for i in range(events)
+    )
+    complete = sorted(
+        max(received[i] for received in receipts) - published[i] for i in range(events)
+    )
+    publish_cost.sort()
+    return {
+        "subscribers": subscribers,
+        "events": events,
+        "publish_p50_us": round(percentile(publish_cost, 50) * 1e6, 1),
+        "publish_p99_us": round(percentile(publish_cost, 99) * 1e6, 1),
+        "delivery_p50_ms": round(percentile(deliveries, 50) * 1000, 3),
+        "delivery_p99_ms": round(percentile(deliveries, 99) * 1000, 3),
+        "all_delivered_p99_ms": round(percentile(complete, 99) * 1000, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", default="100,500,1000")
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200, help="events published per second")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'subs':>6} {'publish p50 us':>15} {'p99 us':>8} {'deliver p50 ms':>15} {'p99 ms':>8} {'all p99 ms':>11}")
+    for subscribers in (int(n) for n in args.subscribers.split(",")):
+        r = await run(subscribers, args.events, args.rate)
+        results.append(r)
+        print(
+            f"{subscribers:>6} {r['publish_p50_us']:>15.1f} {r['publish_p99_us']:>8.1f} "
+            f"{r['delivery_p50_ms']:>15.3f} {r['delivery_p99_ms']:>8.3f} {r['all_delivered_p99_ms']:>11.3f}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps({"rate": args.rate, "results": results}, indent=2))
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+import gzip
+from typing import Optional
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-ndjson")
+# Bodies this large are compressed on a worker thread, off the event loop
+THREAD_THRESHOLD = 256 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values.
+
+    Brotli wins ties when it is installed.
+    """
+    offered = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            offered[coding] = q
+    wildcard = offered.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = offered.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses above ``minimum_size``.
+
+    Streaming responses (more than one body message) pass through untouched;
+    the export route compresses its own stream.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = start_message.get("headers", [])
+            body = message.get("body", b"")
+            content_type = ""
+            already_encoded = False
+            for name, value in headers:
+                if name == b"content-type":
+                    content_type = value.decode("latin-1")
+                elif name == b"content-encoding":
+                    already_encoded = True
+            if (
+                message.get("more_body", False)
+                or already_encoded
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= THREAD_THRESHOLD:
+                compressed = await anyio.to_thread.run_sync(self.compress, body, encoding)
+            else:
+                compressed = self.compress(body, encoding)
+            vary = [value for name, value in headers if name == b"vary"]
+            headers = [
+                (name, value) for name, value in headers
+                if name not in (b"content-length", b"vary")
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+import orjson
+from pymongo.errors import PyMongoError
+
+
+logger = logging.getLogger(__name__)
+
+# Live order and ledger events for GET /stream. Events are published once per
+# change and fanned out to per-party subscriber queues, encoded as an SSE
+# frame once rather than per subscriber. They come either from a MongoDB
+# change stream (replica sets only, so writes from every worker show up) or,
+# without one, from the write handlers of this process.
+EVENT_TYPES = {
+    "orders": "order",
+    "material_transactions": "material_transaction",
+    "financial_transactions": "financial_transaction",
+}
+# Fields carried by the events
+EVENT_FIELDS = {
+    "orders": (
+        "party_name", "order_type", "status", "priority", "total_price", "total_weight",
+        "created_at", "updated_at",
+    ),
+    "material_transactions": ("order_id", "order_type", "amount", "description", "created_at"),
+    "financial_transactions": ("amount", "payment_type", "description", "created_at"),
+}
+# Order updates touching none of these (a sync_seq bump, say) are not sent
+ORDER_UPDATE_FIELDS = ("status", "priority", "total_price", "total_weight")
+# Events a subscriber may fall behind by before it is dropped
+QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+OVERFLOW_FRAME = b'event: overflow\ndata: {"type":"overflow"}\n\n'
+
+
+def make_event(collection: str, op: str, doc_id, party_id: str, fields: dict) -> Optional[dict]:
+    data = {name: fields[name] for name in EVENT_FIELDS[collection] if name in fields}
+    if op == "updated" and not any(name in data for name in ORDER_UPDATE_FIELDS):
+        return None
+    return {
+        "type": f"{EVENT_TYPES[collection]}.{op}",
+        "id": str(doc_id),
+        "party_id": party_id,
+        "data": data,
+    }
+
+
+def encode_frame(event: dict) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+
+
+class Subscription:
+    def __init__(self, party_id: Optional[str], queue_size: int):
+        self.party_id = party_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+
+class EventBroker:
+    """In-process pub/sub from published events to subscriber queues.
+
+    A subscriber that falls QUEUE_SIZE events behind gets an overflow event
+    and is dropped, rather than slowing the publisher down; its client should
+    reconnect and catch up through /sync.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        # Set while a change stream feeds the broker, so handlers don't publish twice
+        self.change_stream = False
+        self._subscribers: Dict[Optional[str], Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, party_id: Optional[str] = None) -> Subscription:
+        """Events of one party, or of every party when ``party_id`` is None."""
+        subscription = Subscription(party_id, self.queue_size)
+        self._subscribers[party_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.party_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.party_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event: Optional[dict]):
+        if event is None:
+            return
+        targets = [*self._subscribers.get(event["party_id"], ()), *self._subscribers.get(None, ())]
+        if not targets:
+            return
+        frame = encode_frame(event)
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.unsubscribe(subscription)
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(OVERFLOW_FRAME)
+
+    def emit(self, events: Iterable[Optional[dict]]):
+        # Called by the write handlers; a change stream reports the same writes
+        if not self.change_stream:
+            for event in events:
+                self.publish(event)
+
+
+async def sse_frames(broker: EventBroker, party_id: Optional[str], keepalive: float = KEEPALIVE_SECONDS):
+    """SSE body for one subscriber, with comment lines to keep proxies from timing out."""
+    subscription = broker.subscribe(party_id)
+    try:
+        yield b": connected\n\n"
+        queue = subscription.queue
+        while True:
+            frames = []
+            if queue.empty():
+                try:
+                    # Unlike wait_for, timeout() doesn't wrap get() in a task
+                    async with asyncio.timeout(keepalive):
+                        frames.append(await queue.get())
+                except TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+            # Everything queued goes out in one write
+            frames += [queue.get_nowait() for _ in range(queue.qsize())]
+            yield b"".join(frames)
+            if frames[-1] is OVERFLOW_FRAME:
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def supports_change_streams(client) -> bool:
+    # Change streams need a replica set or a sharded cluster
+    hello = await client.admin.command("hello")
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+def event_from_change(change: dict) -> Optional[dict]:
+    collection = change["ns"]["coll"]
+    doc = change.get("fullDocument")
+    if doc is None:
+        return None
+    if change["operationType"] == "insert":
+        return make_event(collection, "created", doc["_id"], doc.get("party_id"), doc)
+    fields = change.get("updateDescription", {}).get("updatedFields", doc)
+    return make_event(collection, "updated", doc["_id"], doc.get("party_id"), {
+        name: doc.get(name) for name in fields if name in EVENT_FIELDS[collection]
+    })
+
+
+async def watch_changes(db, broker: EventBroker, retry_seconds: float = 1.0):
+    """Feed the broker from a change stream on the event collections until cancelled.
+
+    Resumes after the last seen change when the stream breaks. The handlers
+    publish only while the stream is open, so events keep flowing while a
+    failing watch is retried.
+    """
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(EVENT_TYPES)},
+        "operationType": {"$in": ["insert", "update", "replace"]},
+    }}]
+    resume_token = None
+    try:
+        while True:
+            try:
+                async with db.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    broker.change_stream = True
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        broker.publish(event_from_change(change))
+            except PyMongoError:
+                broker.change_stream = False
+                logger.exception("Change stream failed, resuming in %.0fs", retry_seconds)
+                await asyncio.sleep(retry_seconds)
+    finally:
+        broker.change_stream = False
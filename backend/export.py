@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from bson import ObjectId
+
+
+# Columns written for CSV exports, in order. NDJSON exports keep every
+# field of the model; internal fields (sync_seq, outbox) are projected out.
+EXPORT_COLUMNS: Dict[str, List[str]] = {
+    "orders": [
+        "id", "party_id", "party_name", "order_type", "status", "priority",
+        "total_price", "total_weight", "products", "reference_order_id",
+        "created_at", "updated_at",
+    ],
+    "material_transactions": [
+        "id", "party_id", "party_name", "order_id", "order_type", "amount",
+        "description", "created_at",
+    ],
+    "financial_transactions": [
+        "id", "party_id", "party_name", "payment_type", "payment_method",
+        "amount", "description", "created_at",
+    ],
+}
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+# Rows are buffered into chunks of about this many bytes before being sent
+CHUNK_SIZE = 64 * 1024
+CURSOR_BATCH_SIZE = 1000
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _ndjson_row(doc: dict) -> str:
+    doc["id"] = str(doc.pop("_id"))
+    return json.dumps(doc, default=_json_default) + "\n"
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+async def _rows(cursor, fmt: str, columns: List[str]) -> AsyncIterator[str]:
+    if fmt == "ndjson":
+        async for doc in cursor:
+            yield _ndjson_row(doc)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        writer.writerow([_csv_cell(doc.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def export_stream(cursor, collection: str, fmt: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """Encode documents from ``cursor`` as NDJSON or CSV, optionally gzipped.
+
+    Only one chunk of output is held in memory at a time, whatever the
+    number of rows.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending = []
+    pending_size = 0
+
+    async for row in _rows(cursor, fmt, EXPORT_COLUMNS[collection]):
+        pending.append(row)
+        pending_size += len(row)
+        if pending_size >= CHUNK_SIZE:
+            chunk = "".join(pending).encode()
+            pending, pending_size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = "".join(pending).encode()
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+
+# Idempotency-Key support for create routes. The first request with a key
+# claims it by inserting {_id: "<scope>:<key>"} into idempotency_keys; the
+# insert is the only lookup a new request pays, a probe of the _id index. The
+# response is stored on the claim when the request succeeds and replayed for
+# repeats; a failed request releases its claim so it can be retried. Keys
+# expire through a TTL index on created_at.
+# Storing the response is a separate write from the documents the request
+# created, so a request can commit and still die before it. The created
+# documents therefore carry the claim's _id as their idempotency_key, and a
+# retry that takes over an abandoned claim first looks for them and replays
+# them instead of creating the same thing again.
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# A claim without a response this old belongs to a request that died mid-way
+PENDING_TIMEOUT = timedelta(minutes=1)
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    pass
+
+
+class RequestInProgress(IdempotencyError):
+    pass
+
+
+class KeyReused(IdempotencyError):
+    pass
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    """Claims, stored responses and a front cache of completed keys.
+
+    The cache answers repeats without a round trip; like the other caches it
+    is per process, and a miss falls through to the collection.
+    """
+
+    def __init__(self, cache_size: int = 10000, cache_ttl: float = 600):
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    async def begin(
+        self, db, scope: str, key: str, request_hash: str,
+        recover: Optional[Callable[[str], Awaitable[Optional[dict]]]] = None,
+    ) -> Optional[dict]:
+        """Claim ``key`` for a new request, or return the stored response of a repeat.
+
+        Raises RequestInProgress while the first request is still running and
+        KeyReused if the key came with a different request body. ``recover``
+        is called with the claim's _id when an abandoned claim is taken over
+        and returns the response of what that request already created, if
+        anything.
+        """
+        doc_id = f"{scope}:{key}"
+        found, entry = self.cache.get(doc_id)
+        if found:
+            return self._replay(entry, request_hash)
+
+        now = datetime.utcnow()
+        claim = {"_id": doc_id, "fingerprint": request_hash, "response": None, "created_at": now}
+        try:
+            await db.idempotency_keys.insert_one(claim)
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await db.idempotency_keys.find_one({"_id": doc_id})
+        if existing is None:
+            # Expired or released in between; the retry will claim it
+            raise RequestInProgress(key)
+        if existing["response"] is not None:
+            self.cache.set(doc_id, existing)
+            return self._replay(existing, request_hash)
+        if existing["fingerprint"] != request_hash:
+            raise KeyReused(key)
+        if now - existing["created_at"] < PENDING_TIMEOUT:
+            raise RequestInProgress(key)
+        # Take over the abandoned claim, unless another retry got there first
+        result = await db.idempotency_keys.update_one(
+            {"_id": doc_id, "created_at": existing["created_at"], "response": None},
+            {"$set": {"created_at": now}}
+        )
+        if result.modified_count == 0:
+            raise RequestInProgress(key)
+        response = await recover(doc_id) if recover else None
+        if response is not None:
+            await self.complete(db, scope, key, request_hash, response)
+        return response
+
+    def _replay(self, entry: dict, request_hash: str) -> dict:
+        if entry["fingerprint"] != request_hash:
+            raise KeyReused(entry["_id"].partition(":")[2])
+        return entry["response"]
+
+    async def complete(self, db, scope: str, key: str, request_hash: str, response: dict):
+        doc_id = f"{scope}:{key}"
+        await db.idempotency_keys.update_one({"_id": doc_id}, {"$set": {"response": response}})
+        self.cache.set(doc_id, {"_id": doc_id, "fingerprint": request_hash, "response": response})
+
+    async def release(self, db, scope: str, key: str):
+        await db.idempotency_keys.delete_one({"_id": f"{scope}:{key}", "response": None})
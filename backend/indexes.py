@@ -0,0 +1,294 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from idempotency import IDEMPOTENCY_TTL
+from search import prefix_filter
+from sync import SYNC_COLLECTIONS, TOMBSTONE_RETENTION
+
+
+logger = logging.getLogger(__name__)
+
+
+# Indexes backing the queries issued by server.py, keyed by collection.
+# create_indexes is a no-op for an index that already exists with the same
+# keys and name, so this can run on every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "parties": [
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+        # Typeahead search (multikey)
+        IndexModel([("name_terms", ASCENDING)], name="name_terms"),
+    ],
+    "products": [
+        IndexModel([("name_terms", ASCENDING)], name="name_terms"),
+    ],
+    "orders": [
+        # Open-order queue of a party (max priority, moves, rebalancing)
+        IndexModel(
+            [("party_id", ASCENDING), ("status", ASCENDING), ("priority", ASCENDING)],
+            name="party_status_priority",
+        ),
+        # GET /orders?party_id= keyset pages
+        IndexModel(
+            [("party_id", ASCENDING), ("priority", ASCENDING), ("_id", ASCENDING)],
+            name="party_priority_id",
+        ),
+        # GET /orders keyset pages without a party filter
+        IndexModel([("priority", ASCENDING), ("_id", ASCENDING)], name="priority_id"),
+        # Exports in creation order, with and without a party filter
+        IndexModel(
+            [("party_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            name="party_created_at_id",
+        ),
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+        # Orders waiting for the outbox workers; only those are indexed
+        IndexModel(
+            [("outbox.partition", ASCENDING), ("_id", ASCENDING)],
+            name="outbox_partition_id",
+            partialFilterExpression={"outbox": {"$exists": True}},
+        ),
+        # Takeover of an abandoned Idempotency-Key claim; keyed orders only
+        IndexModel(
+            [("idempotency_key", ASCENDING)],
+            name="idempotency_key",
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+        ),
+    ],
+    "material_transactions": [
+        IndexModel(
+            [("party_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="party_created_at_id",
+        ),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+    ],
+    "financial_transactions": [
+        IndexModel(
+            [("party_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="party_created_at_id",
+        ),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("idempotency_key", ASCENDING)],
+            name="idempotency_key",
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+        ),
+    ],
+    "rollups": [
+        # Target of the $inc upserts; also serves party-filtered summaries
+        IndexModel(
+            [("period", ASCENDING), ("party_id", ASCENDING), ("product_id", ASCENDING),
+             ("bucket", ASCENDING), ("order_type", ASCENDING)],
+            name="period_party_product_bucket_type",
+            unique=True,
+        ),
+        # Summaries over all parties
+        IndexModel(
+            [("period", ASCENDING), ("product_id", ASCENDING), ("bucket", ASCENDING)],
+            name="period_product_bucket",
+        ),
+    ],
+    "stock_movements": [
+        # GET /stock/{product_id}/history keyset pages, newest first
+        IndexModel(
+            [("product_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="product_created_at_id",
+        ),
+    ],
+    "tombstones": [
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+        # Expired tombstones are removed by the TTL monitor
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            name="deleted_at_ttl",
+            expireAfterSeconds=int(TOMBSTONE_RETENTION.total_seconds()),
+        ),
+    ],
+    "reconcile_drift": [
+        # Target of the per-chunk upserts
+        IndexModel([("run_id", ASCENDING), ("party_id", ASCENDING)], name="run_party", unique=True),
+        # GET /admin/reconcile/{run_id} keyset pages
+        IndexModel([("run_id", ASCENDING), ("_id", ASCENDING)], name="run_id_id"),
+    ],
+    "idempotency_keys": [
+        # Lookups are by _id; this only expires old keys
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=int(IDEMPOTENCY_TTL.total_seconds()),
+        ),
+    ],
+}
+# GET /sync reads every synced collection by sync_seq
+for _collection in SYNC_COLLECTIONS:
+    INDEXES[_collection].append(IndexModel([("sync_seq", ASCENDING)], name="sync_seq"))
+
+
+# Representative shapes of the queries server.py runs. The filter values are
+# placeholders; only the shape matters to the query planner.
+CANONICAL_QUERIES: List[Dict[str, Any]] = [
+    {
+        "name": "products_page",
+        "collection": "products",
+        "filter": {},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "parties_page",
+        "collection": "parties",
+        "filter": {},
+        "sort": [("created_at", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "party_search",
+        "collection": "parties",
+        "filter": prefix_filter("a"),
+        "sort": [("name_terms", ASCENDING)],
+    },
+    {
+        "name": "product_search",
+        "collection": "products",
+        "filter": prefix_filter("a"),
+        "sort": [("name_terms", ASCENDING)],
+    },
+    {
+        "name": "open_orders_by_priority",
+        "collection": "orders",
+        "filter": {"party_id": "", "status": {"$in": ["start", "inprocess"]}},
+        "sort": [("priority", DESCENDING)],
+    },
+    {
+        "name": "party_orders_page",
+        "collection": "orders",
+        "filter": {"party_id": ""},
+        "sort": [("priority", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "orders_page",
+        "collection": "orders",
+        "filter": {},
+        "sort": [("priority", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "party_orders_export",
+        "collection": "orders",
+        "filter": {"party_id": ""},
+        "sort": [("created_at", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "orders_export",
+        "collection": "orders",
+        "filter": {"created_at": {"$gte": datetime.min}},
+        "sort": [("created_at", ASCENDING), ("_id", ASCENDING)],
+    },
+    {
+        "name": "party_material_transactions_page",
+        "collection": "material_transactions",
+        "filter": {"party_id": ""},
+        "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "material_transactions_page",
+        "collection": "material_transactions",
+        "filter": {},
+        "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "party_financial_transactions_page",
+        "collection": "financial_transactions",
+        "filter": {"party_id": ""},
+        "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "financial_transactions_page",
+        "collection": "financial_transactions",
+        "filter": {},
+        "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "order_by_idempotency_key",
+        "collection": "orders",
+        "filter": {"idempotency_key": ""},
+        "sort": [("idempotency_key", ASCENDING)],
+    },
+    {
+        "name": "financial_transaction_by_idempotency_key",
+        "collection": "financial_transactions",
+        "filter": {"idempotency_key": ""},
+        "sort": [("idempotency_key", ASCENDING)],
+    },
+    {
+        "name": "stock_levels_page",
+        "collection": "stock",
+        "filter": {},
+        "sort": [("_id", ASCENDING)],
+    },
+    {
+        "name": "product_stock_history_page",
+        "collection": "stock_movements",
+        "filter": {"product_id": ""},
+        "sort": [("created_at", DESCENDING), ("_id", DESCENDING)],
+    },
+    {
+        "name": "party_rollup_summary",
+        "collection": "rollups",
+        "filter": {"period": "day", "party_id": "", "product_id": None, "bucket": {"$gte": datetime.min}},
+        "sort": [("bucket", ASCENDING)],
+    },
+    {
+        "name": "rollup_summary",
+        "collection": "rollups",
+        "filter": {"period": "day", "product_id": None, "bucket": {"$gte": datetime.min}},
+        "sort": [("bucket", ASCENDING)],
+    },
+] + [
+    {
+        "name": f"{collection}_sync",
+        "collection": collection,
+        "filter": {"sync_seq": {"$gt": 0, "$lte": 0}},
+        "sort": [("sync_seq", ASCENDING)],
+    }
+    for collection in SYNC_COLLECTIONS + ("tombstones",)
+]
+
+
+async def ensure_indexes(db):
+    for collection, models in INDEXES.items():
+        names = await db[collection].create_indexes(models)
+        logger.info("Ensured indexes on %s: %s", collection, ", ".join(names))
+
+
+def _plan_stages(plan) -> List[str]:
+    # Walk a winningPlan tree (classic or SBE explain output) collecting stage names
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def explain_queries(db) -> List[Dict[str, Any]]:
+    """Explain every canonical query and flag those not served by an index.
+
+    A query is uncovered if its winning plan scans the whole collection or
+    sorts in memory.
+    """
+    report = []
+    for query in CANONICAL_QUERIES:
+        cursor = db[query["collection"]].find(query["filter"]).sort(query["sort"]).limit(1)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        report.append({
+            "name": query["name"],
+            "collection": query["collection"],
+            "stages": stages,
+            "covered": "COLLSCAN" not in stages and "SORT" not in stages,
+        })
+    return report
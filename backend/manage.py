@@ -0,0 +1,106 @@
+"""Maintenance commands, run from the backend directory:
+
+    python manage.py rebuild-rollups --server-stopped
+    python manage.py recompute-stock --server-stopped
+    python manage.py reconcile-balances [--chunk-size 1000] [--concurrency 4] [--resume RUN_ID]
+
+The server's ETag versions and caches live in its process and would not see
+writes made from here, so rebuild-rollups and recompute-stock are for when
+no server is running, and reconcile-balances only reports. With the server
+up, use the matching /api/admin routes.
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from mongo import MongoSettings
+from reconcile import CHUNK_SIZE, CONCURRENCY, reconcile_balances, resume_run, start_run
+from rollups import rebuild_rollups
+from stock import recompute_stock
+
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+def require_server_stopped(args, route: str):
+    if not args.server_stopped:
+        raise SystemExit(
+            f"A running server would keep serving cached results: use POST {route}, "
+            "or pass --server-stopped once it is down"
+        )
+
+
+async def rebuild_rollups_command(db, args):
+    require_server_stopped(args, "/api/admin/rollups/rebuild")
+    count = await rebuild_rollups(db)
+    print(f"Rebuilt rollups: {count} documents")
+
+
+async def recompute_stock_command(db, args):
+    require_server_stopped(args, "/api/admin/stock/recompute")
+    count = await recompute_stock(db)
+    print(f"Recomputed stock: {count} products")
+
+
+async def reconcile_balances_command(db, args):
+    if args.resume:
+        run_id = ObjectId(args.resume)
+        if await db.reconcile_runs.count_documents({"_id": run_id, "fix": True}):
+            raise SystemExit(
+                f"Run {run_id} fixes balances: resume it with POST /api/admin/reconcile?resume={run_id}"
+            )
+        run = await resume_run(db, run_id)
+        if run is None:
+            raise SystemExit(f"No unfinished run {args.resume}")
+    else:
+        run = await start_run(db, False, args.chunk_size)
+    print(f"Run {run['_id']}")
+    run = await reconcile_balances(db, run, args.concurrency)
+    print(f"Checked {run['parties_checked']} parties in {run['finished_at'] - run['started_at']}")
+    for status, row in sorted(run["summary"].items()):
+        print(f"  {status}: {row['parties']} parties, {row['drift']} total drift")
+
+
+COMMANDS = {
+    "rebuild-rollups": (rebuild_rollups_command, "regenerate the report rollups from the orders"),
+    "recompute-stock": (recompute_stock_command, "rebuild stock levels from the orders"),
+    "reconcile-balances": (reconcile_balances_command, "report party balances that drifted from the ledgers"),
+}
+
+SERVER_STOPPED = (("--server-stopped",), {"action": "store_true", "help": "confirm no server is running"})
+# Options of the commands that take any: name -> [(flags, add_argument kwargs)]
+ARGUMENTS = {
+    "rebuild-rollups": [SERVER_STOPPED],
+    "recompute-stock": [SERVER_STOPPED],
+    "reconcile-balances": [
+        (("--chunk-size",), {"type": int, "default": CHUNK_SIZE}),
+        (("--concurrency",), {"type": int, "default": CONCURRENCY}),
+        (("--resume",), {"metavar": "RUN_ID", "help": "continue an interrupted run"}),
+    ],
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help)
+        for flags, kwargs in ARGUMENTS.get(name, []):
+            subparser.add_argument(*flags, **kwargs)
+    args = parser.parse_args()
+
+    settings = MongoSettings.from_env()
+    client = AsyncIOMotorClient(settings.url, **settings.client_kwargs())
+    try:
+        await COMMANDS[args.command][0](client[settings.db_name], args)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
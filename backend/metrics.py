@@ -0,0 +1,200 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, lock: threading.Lock, name: str, help: str, labelnames: Sequence[str]):
+        self._lock = lock
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            # Whole counts print exactly; {:g} would round past six digits
+            value = int(value) if value.is_integer() else value
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, lock: threading.Lock, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self._lock = lock
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: non-cumulative bucket counts (+Inf last), sum, count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal Prometheus registry; renders the text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str]) -> Counter:
+        metric = Counter(self._lock, name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(self._lock, name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request count and latency per route template.
+
+    The route is read from the scope after routing, so /api/orders/{order_id}
+    is one series however many ids are requested. ``streaming_routes`` are
+    counted but left out of the latency histogram: an event stream or a long
+    download stays open for as long as the client reads, which isn't latency.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, streaming_routes: Iterable[str] = ()):
+        self.app = app
+        self.streaming_routes = frozenset(streaming_routes)
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route and status.",
+            ("method", "route", "status"),
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.",
+            ("method", "route"), HTTP_BUCKETS,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            if path not in self.streaming_routes:
+                self.latency.observe((method, path), time.perf_counter() - start)
+            self.requests.inc((method, path, status))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording duration and document counts per collection and command."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.commands = registry.counter(
+            "mongo_commands_total", "MongoDB commands by collection, command and outcome.",
+            ("collection", "command", "outcome"),
+        )
+        self.latency = registry.histogram(
+            "mongo_command_duration_seconds", "MongoDB command latency.",
+            ("collection", "command"), MONGO_BUCKETS,
+        )
+        self.documents = registry.counter(
+            "mongo_documents_total", "Documents returned or written by MongoDB commands.",
+            ("collection", "command"),
+        )
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[Tuple[int, object], str] = {}
+
+    def started(self, event):
+        command = event.command
+        if event.command_name == "getMore":
+            collection = command.get("collection", "")
+        else:
+            collection = command.get(event.command_name, "")
+        if not isinstance(collection, str):
+            collection = ""
+        with self._pending_lock:
+            self._pending[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, outcome: str) -> Tuple[str, str]:
+        with self._pending_lock:
+            collection = self._pending.pop((event.request_id, event.connection_id), "")
+        labels = (collection, event.command_name)
+        self.latency.observe(labels, event.duration_micros / 1e6)
+        self.commands.inc(labels + (outcome,))
+        return labels
+
+    def succeeded(self, event):
+        labels = self._finish(event, "success")
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if isinstance(cursor, dict):
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch is not None:
+                self.documents.inc(labels, len(batch))
+        elif isinstance(reply.get("n"), int):
+            self.documents.inc(labels, reply["n"])
+
+    def failed(self, event):
+        self._finish(event, "failure")
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from pymongo import monitoring
+
+
+# Wire compressors the driver can use with what requirements.txt installs:
+# zlib is in the standard library, while zstd and snappy would need the
+# zstandard and python-snappy packages
+SUPPORTED_COMPRESSORS = ("zlib",)
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    """Motor client options, read from the environment.
+
+    Unset pool options fall back to the driver defaults.
+    """
+    url: str
+    db_name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    server_selection_timeout_ms: int = 30000
+    connect_timeout_ms: int = 20000
+    compressors: str = ""  # "zlib" or empty
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        return cls(
+            url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            max_pool_size=_env_int('MONGO_MAX_POOL_SIZE', 100),
+            min_pool_size=_env_int('MONGO_MIN_POOL_SIZE', 0),
+            max_idle_time_ms=_env_int('MONGO_MAX_IDLE_TIME_MS'),
+            wait_queue_timeout_ms=_env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            server_selection_timeout_ms=_env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000),
+            connect_timeout_ms=_env_int('MONGO_CONNECT_TIMEOUT_MS', 20000),
+            compressors=os.environ.get('MONGO_COMPRESSORS', ""),
+        )
+
+    def __post_init__(self):
+        unsupported = [
+            name for name in self.compressors.split(",")
+            if name.strip() and name.strip() not in SUPPORTED_COMPRESSORS
+        ]
+        if unsupported:
+            raise ValueError(
+                f"Unsupported MONGO_COMPRESSORS {', '.join(unsupported)}; "
+                f"expected one of {', '.join(SUPPORTED_COMPRESSORS)}"
+            )
+
+    def client_kwargs(self) -> dict:
+        kwargs = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+        }
+        if self.max_idle_time_ms is not None:
+            kwargs["maxIdleTimeMS"] = self.max_idle_time_ms
+        if self.wait_queue_timeout_ms is not None:
+            kwargs["waitQueueTimeoutMS"] = self.wait_queue_timeout_ms
+        if self.compressors:
+            kwargs["compressors"] = self.compressors
+        return kwargs
+
+    def describe(self) -> dict:
+        # Options without the URL, which may carry credentials
+        options = asdict(self)
+        del options["url"]
+        return options
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool state per server from pymongo's CMAP events.
+
+    Motor runs driver calls on worker threads, so counters are lock-protected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = defaultdict(lambda: {
+            "open": 0,
+            "checked_out": 0,
+            "wait_queue": 0,
+            "created_total": 0,
+            "closed_total": 0,
+            "check_out_failed_total": 0,
+            "cleared_total": 0,
+        })
+
+    def _update(self, address, **deltas):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            pool = self._pools[key]
+            for name, delta in deltas.items():
+                pool[name] += delta
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared_total=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created_total=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed_total=1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, wait_queue=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, wait_queue=-1, check_out_failed_total=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, wait_queue=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+
+async def warm_pool(client, connections: int):
+    # Concurrent pings make the driver open up to `connections` sockets now
+    # instead of on the first requests
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, connections))))
+
+
+async def ping_latency_ms(client) -> float:
+    start = time.perf_counter()
+    await client.admin.command("ping")
+    return (time.perf_counter() - start) * 1000
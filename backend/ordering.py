@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from sequences import (
+    OPEN_STATUSES,
+    allocate_priorities,
+    current_sequence,
+    force_sequence,
+    reset_sequence,
+)
+from sync import sync_clock
+
+
+logger = logging.getLogger(__name__)
+
+# Completed orders are parked here so they sort below the open queue
+COMPLETED_PRIORITY = 9999
+
+# Open-order priorities are fractional: moving an order writes a key between
+# its new neighbours and leaves every other order alone. Repeated moves into
+# the same gap halve it each time, so once a gap gets narrower than
+# REBALANCE_GAP (or keys drift up towards COMPLETED_PRIORITY) the party's queue
+# is renumbered to 0..n-1 in the background, and the party's priority
+# sequence restarts after it. Below MIN_GAP there is no room left and the
+# caller must rebalance before placing the order.
+# That restart is a compare-and-set, which steady writes to the party can keep
+# losing, so claim_priorities also clamps the sequence: a block that would
+# reach PRIORITY_CEILING renumbers the queue and forces the restart instead,
+# and open orders never get near COMPLETED_PRIORITY.
+MIN_GAP = 1e-9
+REBALANCE_GAP = 1e-4
+PRIORITY_CEILING = COMPLETED_PRIORITY // 2
+
+
+def key_between(lo: Optional[float], hi: Optional[float]) -> Optional[float]:
+    """Priority strictly between ``lo`` and ``hi`` (either may be open-ended).
+
+    Returns None when the gap is too narrow to split.
+    """
+    if lo is None and hi is None:
+        return 0.0
+    if lo is None:
+        return hi - 1
+    if hi is None:
+        return lo + 1
+    if hi - lo < MIN_GAP:
+        return None
+    mid = lo + (hi - lo) / 2
+    if not lo < mid < hi:
+        return None
+    return mid
+
+
+def needs_rebalance(lo: Optional[float], hi: Optional[float], key: float) -> bool:
+    if abs(key) >= PRIORITY_CEILING:
+        return True
+    return lo is not None and hi is not None and hi - lo < REBALANCE_GAP
+
+
+def _longest_increasing_run(values: List[float]) -> List[int]:
+    # Indexes of one longest strictly increasing subsequence, O(n log n)
+    tails = []
+    tail_idx = []
+    parent = [-1] * len(values)
+    for i, value in enumerate(values):
+        pos = bisect_left(tails, value)
+        if pos == len(tails):
+            tails.append(value)
+            tail_idx.append(i)
+        else:
+            tails[pos] = value
+            tail_idx[pos] = i
+        parent[i] = tail_idx[pos - 1] if pos > 0 else -1
+    keep = []
+    i = tail_idx[-1] if tail_idx else -1
+    while i != -1:
+        keep.append(i)
+        i = parent[i]
+    return keep[::-1]
+
+
+def plan_reorder(priorities: List[float]) -> Optional[List[Optional[float]]]:
+    """New priorities that put the orders in list order with the fewest writes.
+
+    ``priorities`` are the current priorities of the orders in their requested
+    order. The longest already-increasing subsequence stays as it is and every
+    other order gets a key between its kept neighbours. Returns one entry per
+    order, None meaning unchanged, or None overall if some gap has no room.
+    """
+    keep = set(_longest_increasing_run(priorities))
+    plan: List[Optional[float]] = [None] * len(priorities)
+
+    i = 0
+    while i < len(priorities):
+        if i in keep:
+            i += 1
+            continue
+        start = i
+        while i < len(priorities) and i not in keep:
+            i += 1
+        count = i - start
+        lo = priorities[start - 1] if start > 0 else None
+        hi = priorities[i] if i < len(priorities) else None
+        if lo is None:
+            values = [hi - (count - k) for k in range(count)]
+        elif hi is None:
+            values = [lo + k + 1 for k in range(count)]
+        else:
+            step = (hi - lo) / (count + 1)
+            if step < MIN_GAP:
+                return None
+            values = [lo + step * (k + 1) for k in range(count)]
+        plan[start:i] = values
+    return plan
+
+
+async def rebalance_open_orders(db, party_id: str) -> List[Tuple[ObjectId, int]]:
+    """Renumber a party's open queue to 0..n-1, keeping its current order.
+
+    The priority sequence is then moved back to n unless an order was
+    allocated a priority meanwhile, in which case it is left alone. Returns
+    the (order _id, new priority) pairs written.
+    """
+    sequence = await current_sequence(db, party_id)
+    party_orders = await db.orders.find(
+        {"party_id": party_id, "status": {"$in": OPEN_STATUSES}},
+        {"priority": 1}
+    ).sort([("priority", 1), ("_id", 1)]).to_list(None)
+
+    changed = [(idx, po["_id"]) for idx, po in enumerate(party_orders) if po.get("priority") != idx]
+    if changed:
+        async with sync_clock.stamp(db, len(changed)) as seq:
+            result = await db.orders.bulk_write(
+                [
+                    UpdateOne({"_id": oid}, {"$set": {"priority": idx, "sync_seq": seq + i}})
+                    for i, (idx, oid) in enumerate(changed)
+                ],
+                ordered=True
+            )
+        logger.info(
+            "Rebalanced open orders of party %s: matched=%d modified=%d",
+            party_id, result.matched_count, result.modified_count
+        )
+    if sequence is not None and sequence > len(party_orders):
+        await reset_sequence(db, party_id, sequence, len(party_orders))
+    return changed
+
+
+async def claim_priorities(db, party_id: str, count: int = 1) -> int:
+    """Reserve ``count`` priorities for a party's open queue, below PRIORITY_CEILING.
+
+    Past the ceiling the queue is renumbered and the sequence forced back to
+    its length, one task per party at a time. Whichever process forces it
+    first wins; everyone else just allocates again from the restarted
+    sequence.
+    """
+    start = await allocate_priorities(db, party_id, count)
+    if start + count <= PRIORITY_CEILING:
+        return start
+    async with _ceiling_locks.setdefault(party_id, asyncio.Lock()):
+        await rebalance_open_orders(db, party_id)
+        size = await db.orders.count_documents({"party_id": party_id, "status": {"$in": OPEN_STATUSES}})
+        if await force_sequence(db, party_id, PRIORITY_CEILING, size):
+            logger.info("Priority sequence of party %s hit the ceiling, restarted at %d", party_id, size)
+        return await allocate_priorities(db, party_id, count)
+
+
+_ceiling_locks = {}
+_rebalancing = {}
+
+
+def schedule_rebalance(
+    db, party_id: str, on_done: Optional[Callable[[str, List[Tuple[ObjectId, int]]], None]] = None
+):
+    """Rebalance a party's queue in a background task, at most one per party."""
+    if party_id in _rebalancing:
+        return
+
+    async def run():
+        try:
+            changed = await rebalance_open_orders(db, party_id)
+            if on_done:
+                on_done(party_id, changed)
+        except Exception:
+            logger.exception("Rebalancing open orders of party %s failed", party_id)
+        finally:
+            _rebalancing.pop(party_id, None)
+
+    _rebalancing[party_id] = asyncio.create_task(run())
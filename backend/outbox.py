@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from sync import sync_clock
+
+
+logger = logging.getLogger(__name__)
+
+# Deferred side effects of order creation. In async mode the order is
+# inserted with an "outbox" field holding its material transaction, so the
+# order and its pending effects are one write. A pool of workers, each
+# owning the parties that hash to its partition, drains flagged orders in
+# batches: one insert_many for the material transactions and one $inc per
+# party for the whole batch, then the flag is removed.
+#
+# Before applying, a worker records the batch (its order ids) in
+# outbox_batches. Material transactions carry their _id from the outbox, so
+# inserting them again is a duplicate-key no-op, and each party records the
+# last batch applied to it, so its $inc is skipped on a retry. After a
+# crash, start() replays the recorded batches, then drains whatever the
+# previous process left flagged, before any worker runs; this makes every
+# effect apply exactly once even if the number of workers changed. A server
+# in sync mode runs the same recovery without starting workers, so orders
+# left by an earlier async run are not stranded. Like the caches, this
+# assumes a single process drains the outbox.
+OUTBOX_FIELD = "outbox"
+DUPLICATE_KEY = 11000
+
+
+def partition_of(party_id: str, workers: int) -> int:
+    return zlib.crc32(party_id.encode()) % workers
+
+
+class Outbox:
+    def __init__(
+        self, workers: int = 4, batch_size: int = 200, poll_interval: float = 1.0,
+        linger: float = 0.005, on_applied: Optional[Callable[[List[dict]], None]] = None
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # Wait this long after a wakeup so orders arriving together share a batch
+        self.linger = linger
+        # Called with the material transactions of each applied batch
+        self.on_applied = on_applied
+        self.db = None
+        self._wakeups = [asyncio.Event() for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        # Batches whose apply failed, retried under the same id before any other
+        self._unfinished: Dict[Optional[int], tuple] = {}
+
+    def entry(self, material_transaction: dict) -> dict:
+        """The outbox field of a new order; the transaction must have its _id."""
+        return {
+            "partition": partition_of(material_transaction["party_id"], self.workers),
+            "material_transaction": material_transaction,
+        }
+
+    def notify(self, entry: dict):
+        self._wakeups[entry["partition"]].set()
+
+    async def start(self, db):
+        await self.recover(db)
+        self._tasks = [asyncio.create_task(self._run(p)) for p in range(self.workers)]
+
+    async def stop(self):
+        # Orders still flagged are drained on the next start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def recover(self, db) -> int:
+        """Finish the batches a previous process recorded but didn't complete,
+        then apply the rest of its backlog."""
+        self.db = db
+        recovered = 0
+        async for batch in self.db.outbox_batches.find({}):
+            orders = await self.db.orders.find(
+                {"_id": {"$in": batch["order_ids"]}, OUTBOX_FIELD: {"$exists": True}},
+                {OUTBOX_FIELD: 1}
+            ).to_list(None)
+            await self._apply(batch["_id"], orders)
+            recovered += 1
+        while await self.drain(None):
+            recovered += 1
+        if recovered:
+            logger.info("Recovered %d outbox batches", recovered)
+        return recovered
+
+    async def _run(self, partition: int):
+        wakeup = self._wakeups[partition]
+        while True:
+            wakeup.clear()
+            try:
+                while await self.drain(partition):
+                    pass
+            except Exception:
+                logger.exception("Outbox partition %d failed, retrying", partition)
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                await asyncio.sleep(self.linger)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self, partition: Optional[int]) -> int:
+        """Apply one batch of the partition's pending orders (None: any
+        partition); returns its size."""
+        if partition in self._unfinished:
+            batch_id, orders = self._unfinished.pop(partition)
+        else:
+            batch_id, orders = await self._next_batch(partition)
+            if not orders:
+                return 0
+        try:
+            await self._apply(batch_id, orders)
+        except Exception:
+            self._unfinished[partition] = (batch_id, orders)
+            raise
+        return len(orders)
+
+    async def _next_batch(self, partition: Optional[int]):
+        if partition is None:
+            query = {OUTBOX_FIELD: {"$exists": True}}
+        else:
+            query = {f"{OUTBOX_FIELD}.partition": partition}
+        orders = await self.db.orders.find(
+            query, {OUTBOX_FIELD: 1}
+        ).sort("_id", 1).limit(self.batch_size).to_list(None)
+        batch_id = ObjectId()
+        if orders:
+            await self.db.outbox_batches.insert_one({
+                "_id": batch_id, "partition": partition, "order_ids": [o["_id"] for o in orders],
+            })
+        return batch_id, orders
+
+    async def _apply(self, batch_id: ObjectId, orders: List[dict]):
+        transactions = [o[OUTBOX_FIELD]["material_transaction"] for o in orders]
+        balances: Dict[str, float] = defaultdict(float)
+        for transaction in transactions:
+            balances[transaction["party_id"]] += transaction["amount"]
+
+        if transactions:
+            async with sync_clock.stamp(self.db, len(transactions) + len(balances)) as seq:
+                for i, transaction in enumerate(transactions):
+                    transaction["sync_seq"] = seq + i
+                try:
+                    await self.db.material_transactions.insert_many(transactions, ordered=False)
+                except BulkWriteError as e:
+                    # Already inserted by the interrupted attempt
+                    if any(err["code"] != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                        raise
+                seq += len(transactions)
+                await self.db.parties.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": ObjectId(party_id), "outbox_batch": {"$ne": batch_id}},
+                            {"$inc": {"balance": amount},
+                             "$set": {"outbox_batch": batch_id, "sync_seq": seq + i}}
+                        )
+                        for i, (party_id, amount) in enumerate(balances.items())
+                    ],
+                    ordered=False
+                )
+            await self.db.orders.update_many(
+                {"_id": {"$in": [o["_id"] for o in orders]}}, {"$unset": {OUTBOX_FIELD: ""}}
+            )
+        await self.db.outbox_batches.delete_one({"_id": batch_id})
+        if transactions and self.on_applied:
+            self.on_applied(transactions)
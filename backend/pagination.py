@@ -0,0 +1,95 @@
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_token(values: list) -> str:
+    # bson's json_util keeps ObjectId and datetime values round-trippable
+    raw = json_util.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str, size: int) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def encode_cursor(doc: dict, sort_field: Optional[str]) -> str:
+    # The cursor carries the sort key and _id of the last document on the page
+    value = doc.get(sort_field) if sort_field else None
+    return encode_token([value, doc["_id"]])
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    value, last_id = decode_token(cursor, 2)
+    return value, last_id
+
+
+def keyset_filter(sort_field: Optional[str], direction: int, cursor: str) -> dict:
+    value, last_id = decode_cursor(cursor)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field is None:
+        return {"_id": {op: last_id}}
+    return {
+        "$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}},
+        ]
+    }
+
+
+def sort_spec(sort_field: Optional[str], direction: int) -> List[Tuple[str, int]]:
+    if sort_field is None:
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    sort_field: Optional[str],
+    direction: int = ASCENDING,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Fetch one page of ``collection`` ordered by ``(sort_field, _id)``.
+
+    Returns the raw documents and the cursor for the next page, or ``None``
+    when this is the last page. One extra document is read to detect that,
+    so no count query is needed.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort_field, direction, cursor)]}
+
+    docs = await (
+        collection.find(query, projection)
+        .sort(sort_spec(sort_field, direction))
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, List, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+# Server-side pricing of order lines against the products collection.
+# PRICING_MODE decides what the client may send:
+#   check    (default) every product must exist; missing values come from
+#            the catalog and sent prices/weights must match it
+#   catalog  the catalog's values replace whatever the client sent
+#   fill     legacy: missing values come from the catalog, sent ones are
+#            trusted as they are
+PRICING_MODES = ("fill", "check", "catalog")
+CATALOG_FIELDS = {"product_name": "name", "price": "price", "weight": "weight"}
+CATALOG_PROJECTION = {"name": 1, "price": 1, "weight": 1}
+# Prices/weights closer than this to the catalog's count as equal
+PRICE_TOLERANCE = 1e-6
+
+
+class PricingError(ValueError):
+    pass
+
+
+def lookup_ids(orders_lines: List[List[dict]], mode: str) -> List[str]:
+    """The product ids the catalog has to be read for."""
+    ids = {}
+    for lines in orders_lines:
+        for line in lines:
+            if mode != "fill" or any(line.get(field) is None for field in CATALOG_FIELDS):
+                ids[line["product_id"]] = None
+    return list(ids)
+
+
+async def load_catalog(db, product_ids: Iterable[str], cache) -> Dict[str, dict]:
+    """Name, price and weight of each existing product, through ``cache``.
+
+    Everything the cache misses is read with one $in query.
+    """
+    catalog, missing = {}, []
+    for product_id in product_ids:
+        found, product = cache.get(("price", product_id))
+        if found:
+            catalog[product_id] = product
+            continue
+        try:
+            missing.append(ObjectId(product_id))
+        except (InvalidId, TypeError):
+            pass
+    if missing:
+        async for doc in db.products.find({"_id": {"$in": missing}}, CATALOG_PROJECTION):
+            product = {"name": doc.get("name"), "price": doc.get("price"), "weight": doc.get("weight")}
+            catalog[str(doc["_id"])] = product
+            cache.set(("price", str(doc["_id"])), product)
+    return catalog
+
+
+def price_lines(lines: List[dict], catalog: Dict[str, dict], mode: str) -> List[dict]:
+    """Complete (or check) one order's lines; raises PricingError listing every bad line."""
+    priced, errors = [], []
+    for number, line in enumerate(lines, 1):
+        product = catalog.get(line["product_id"])
+        line = dict(line)
+        if product is None:
+            if mode != "fill" or any(line.get(field) is None for field in CATALOG_FIELDS):
+                errors.append(f"line {number}: unknown product {line['product_id']}")
+            priced.append(line)
+            continue
+        for field, source in CATALOG_FIELDS.items():
+            sent = line.get(field)
+            if sent is None or mode == "catalog":
+                line[field] = product[source]
+            elif mode == "check" and field != "product_name" and abs(sent - product[source]) > PRICE_TOLERANCE:
+                errors.append(f"line {number}: {field} {sent} differs from catalog {product[source]}")
+        priced.append(line)
+    if errors:
+        raise PricingError("; ".join(errors))
+    return priced
+
+
+def order_totals(orders_lines: List[List[dict]]) -> List[Tuple[float, float]]:
+    """(total_price, total_weight) of each order, in one pass over its lines.
+
+    Adds in the same order as sum(), so the totals are unchanged. Lines
+    arrive as dicts, and copying them into NumPy arrays costs more per line
+    than this loop (benchmarks/pricing_bench.py), so the totals stay in
+    Python.
+    """
+    totals = []
+    for lines in orders_lines:
+        total_price = total_weight = 0
+        for line in lines:
+            quantity = line["quantity"]
+            total_price += quantity * line["price"]
+            total_weight += quantity * line["weight"]
+        totals.append((total_price, total_weight))
+    return totals
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from statement import FINANCIAL_BALANCE_CHANGE, MATERIAL_BALANCE_CHANGE
+from sync import sync_clock
+
+
+logger = logging.getLogger(__name__)
+
+# Balance reconciliation. parties.balance is kept by $inc on every ledger
+# write; a run recomputes it from material_transactions and
+# financial_transactions and records every party whose stored balance is
+# off. Parties are checked in chunks of consecutive _ids, several chunks at
+# a time, each chunk costing one find on parties and one grouped aggregation
+# over both ledgers through their party_id indexes. The run document's
+# checkpoint is the first party of the earliest unfinished chunk, so an
+# interrupted run resumes from there.
+CHUNK_SIZE = 1000
+CONCURRENCY = 4
+# Differences up to this are float rounding, not drift
+DRIFT_TOLERANCE = 0.005
+# Ledger rows this recent may still be waiting for their $inc, so a party
+# with one is reported as busy instead of drifted
+SETTLE_TIME = timedelta(seconds=30)
+
+
+def ledger_pipeline(party_ids: List[str]) -> List[dict]:
+    """Pipeline over material_transactions giving each party's ledger balance."""
+    match = {"$match": {"party_id": {"$in": party_ids}}}
+    return [
+        match,
+        {"$project": {"party_id": 1, "created_at": 1, "change": MATERIAL_BALANCE_CHANGE}},
+        {"$unionWith": {"coll": "financial_transactions", "pipeline": [
+            match,
+            {"$project": {"party_id": 1, "created_at": 1, "change": FINANCIAL_BALANCE_CHANGE}},
+        ]}},
+        {"$group": {
+            "_id": "$party_id",
+            "balance": {"$sum": "$change"},
+            "last_entry": {"$max": "$created_at"},
+        }},
+    ]
+
+
+async def ledger_balances(db, party_ids: List[str]) -> Dict[str, dict]:
+    rows = await db.material_transactions.aggregate(ledger_pipeline(party_ids)).to_list(None)
+    return {row["_id"]: row for row in rows}
+
+
+async def check_chunk(db, run_id: ObjectId, chunk: List[ObjectId], fix: bool) -> List[str]:
+    """Compare one chunk of parties with their ledgers, recording any drift.
+
+    Returns the ids of the parties whose balance was fixed.
+    """
+    settled_before = datetime.utcnow() - SETTLE_TIME
+    parties = await db.parties.find(
+        {"_id": {"$in": chunk}}, {"name": 1, "balance": 1}
+    ).to_list(None)
+    ledger = await ledger_balances(db, [str(oid) for oid in chunk])
+
+    drifted = []
+    for party in parties:
+        row = ledger.get(str(party["_id"]), {})
+        stored = party.get("balance", 0.0)
+        computed = row.get("balance", 0.0)
+        if abs(stored - computed) <= DRIFT_TOLERANCE:
+            continue
+        last_entry = row.get("last_entry")
+        busy = last_entry is not None and last_entry >= settled_before
+        drifted.append((party, stored, computed, "busy" if busy else "drift"))
+
+    if fix:
+        fixes = [i for i, (_, _, _, status) in enumerate(drifted) if status == "drift"]
+        if fixes:
+            async with sync_clock.stamp(db, len(fixes)) as seq:
+                # Conditional on the balance read above, so a concurrent $inc wins
+                for n, i in enumerate(fixes):
+                    party, stored, computed, _ = drifted[i]
+                    result = await db.parties.update_one(
+                        {"_id": party["_id"], "balance": stored},
+                        {"$set": {"balance": computed, "sync_seq": seq + n}}
+                    )
+                    drifted[i] = (party, stored, computed, "fixed" if result.modified_count else "busy")
+
+    if drifted:
+        await db.reconcile_drift.bulk_write(
+            [
+                UpdateOne(
+                    {"run_id": run_id, "party_id": str(party["_id"])},
+                    {"$set": {
+                        "party_name": party.get("name"),
+                        "stored": stored,
+                        "computed": computed,
+                        "drift": round(stored - computed, 6),
+                        "status": status,
+                    }},
+                    upsert=True
+                )
+                for party, stored, computed, status in drifted
+            ],
+            ordered=False
+        )
+    return [str(party["_id"]) for party, _, _, status in drifted if status == "fixed"]
+
+
+async def start_run(db, fix: bool, chunk_size: int = CHUNK_SIZE) -> dict:
+    run = {
+        "_id": ObjectId(),
+        "status": "running",
+        "fix": fix,
+        "chunk_size": chunk_size,
+        "checkpoint": None,
+        "parties_checked": 0,
+        "started_at": datetime.utcnow(),
+        "finished_at": None,
+    }
+    await db.reconcile_runs.insert_one(run)
+    return run
+
+
+async def reconcile_balances(
+    db, run: dict, concurrency: int = CONCURRENCY,
+    on_fixed: Optional[Callable[[List[str]], None]] = None
+) -> dict:
+    """Check (and with run["fix"], repair) every party from the run's checkpoint on.
+
+    ``on_fixed`` is called with the ids of the parties each chunk fixed.
+    Returns the finished run document with per-status drift counts.
+    """
+    query = {"_id": {"$gte": run["checkpoint"]}} if run["checkpoint"] else {}
+    party_ids = [doc["_id"] async for doc in db.parties.find(query, {"_id": 1}).sort("_id", 1)]
+    size = run["chunk_size"]
+    chunks = [party_ids[i:i + size] for i in range(0, len(party_ids), size)]
+    done = [False] * len(chunks)
+    next_pending = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint_lock = asyncio.Lock()
+
+    async def run_chunk(i: int):
+        nonlocal next_pending
+        async with semaphore:
+            fixed = await check_chunk(db, run["_id"], chunks[i], run["fix"])
+        if fixed and on_fixed:
+            on_fixed(fixed)
+        async with checkpoint_lock:
+            done[i] = True
+            start = next_pending
+            while next_pending < len(chunks) and done[next_pending]:
+                next_pending += 1
+            if next_pending > start:
+                checked = sum(len(chunk) for chunk in chunks[start:next_pending])
+                checkpoint = chunks[next_pending][0] if next_pending < len(chunks) else None
+                await db.reconcile_runs.update_one(
+                    {"_id": run["_id"]},
+                    {"$set": {"checkpoint": checkpoint}, "$inc": {"parties_checked": checked}}
+                )
+
+    try:
+        await asyncio.gather(*(run_chunk(i) for i in range(len(chunks))))
+    except Exception:
+        await db.reconcile_runs.update_one({"_id": run["_id"]}, {"$set": {"status": "failed"}})
+        raise
+
+    counts = await db.reconcile_drift.aggregate([
+        {"$match": {"run_id": run["_id"]}},
+        {"$group": {"_id": "$status", "parties": {"$sum": 1}, "drift": {"$sum": {"$abs": "$drift"}}}},
+    ]).to_list(None)
+    summary = {row["_id"]: {"parties": row["parties"], "drift": round(row["drift"], 2)} for row in counts}
+    logger.info("Reconciliation %s checked %d parties: %s", run["_id"], len(party_ids), summary)
+    return await db.reconcile_runs.find_one_and_update(
+        {"_id": run["_id"]},
+        {"$set": {"status": "finished", "finished_at": datetime.utcnow(), "summary": summary}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def resume_run(db, run_id: ObjectId) -> Optional[dict]:
+    """The unfinished run to continue, or None if there is none with that id."""
+    return await db.reconcile_runs.find_one_and_update(
+        {"_id": run_id, "status": {"$ne": "finished"}},
+        {"$set": {"status": "running"}},
+        return_document=ReturnDocument.AFTER
+    )
@@ -0,0 +1,260 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from indexes import INDEXES
+
+
+# Daily and monthly sales/purchase aggregates, one document per
+# (period, bucket, order_type, party_id, product_id). Documents with
+# product_id None hold whole-order totals and count orders; the others hold
+# one product and count its order lines. create_order and product edits in
+# update_order keep them current with $inc upserts, and rebuild_rollups
+# regenerates the collection from the orders.
+PERIODS = ("day", "month")
+MEASURES = ("count", "quantity", "total_price", "total_weight")
+GROUP_BY = {
+    "party": ("party_id", "party_name"),
+    "product": ("product_id", "product_name"),
+    "order_type": ("order_type", None),
+    "bucket": ("bucket", None),
+}
+
+RollupKey = Tuple[str, datetime, str, str, Optional[str]]
+
+
+def period_start(ts: datetime, period: str) -> datetime:
+    if period == "month":
+        return datetime(ts.year, ts.month, 1)
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def _add(deltas: dict, order: dict, product_id: Optional[str], product_name: Optional[str], values: dict):
+    for period in PERIODS:
+        key = (
+            period, period_start(order["created_at"], period),
+            order["order_type"], order["party_id"], product_id,
+        )
+        entry = deltas.get(key)
+        if entry is None:
+            entry = deltas[key] = {
+                "party_name": order["party_name"],
+                "product_name": product_name,
+                "inc": dict.fromkeys(MEASURES, 0),
+            }
+        elif product_name is not None:
+            entry["product_name"] = product_name
+        for name, value in values.items():
+            entry["inc"][name] += value
+
+
+def add_order(
+    deltas: Dict[RollupKey, dict],
+    order: dict,
+    products: Optional[Iterable[dict]] = None,
+    sign: int = 1,
+    count_order: bool = True,
+):
+    """Accumulate the rollup increments of an order's lines into ``deltas``.
+
+    ``products`` overrides the order's own lines and ``sign=-1`` takes them
+    out again, so a product edit is the old lines at -1 plus the new at +1
+    with ``count_order=False``.
+    """
+    lines = order["products"] if products is None else products
+    total = dict.fromkeys(MEASURES, 0)
+    total["count"] = sign if count_order else 0
+    for line in lines:
+        quantity = sign * line["quantity"]
+        values = {
+            "count": sign,
+            "quantity": quantity,
+            "total_price": quantity * line["price"],
+            "total_weight": quantity * line["weight"],
+        }
+        _add(deltas, order, line["product_id"], line["product_name"], values)
+        for name in ("quantity", "total_price", "total_weight"):
+            total[name] += values[name]
+    _add(deltas, order, None, None, total)
+
+
+def rollup_requests(deltas: Dict[RollupKey, dict]) -> List[UpdateOne]:
+    requests = []
+    for (period, bucket, order_type, party_id, product_id), entry in deltas.items():
+        inc = {name: value for name, value in entry["inc"].items() if value}
+        if not inc:
+            continue
+        requests.append(UpdateOne(
+            {
+                "period": period,
+                "party_id": party_id,
+                "product_id": product_id,
+                "bucket": bucket,
+                "order_type": order_type,
+            },
+            {
+                "$inc": inc,
+                "$set": {"party_name": entry["party_name"], "product_name": entry["product_name"]},
+            },
+            upsert=True
+        ))
+    return requests
+
+
+async def apply_rollups(db, deltas: Dict[RollupKey, dict]):
+    requests = rollup_requests(deltas)
+    if requests:
+        await db.rollups.bulk_write(requests, ordered=False)
+
+
+async def record_orders(db, orders: Iterable[dict]):
+    """Add newly created orders to the rollups with one bulk write."""
+    deltas = {}
+    for order in orders:
+        add_order(deltas, order)
+    await apply_rollups(db, deltas)
+
+
+async def record_product_edit(db, order: dict, products: List[dict]):
+    """Move an order's rollup contribution from its stored lines to ``products``."""
+    deltas = {}
+    add_order(deltas, order, sign=-1, count_order=False)
+    add_order(deltas, order, products, count_order=False)
+    await apply_rollups(db, deltas)
+
+
+def _bucket_expr(period: str) -> dict:
+    parts = {"year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}}
+    if period == "day":
+        parts["day"] = {"$dayOfMonth": "$created_at"}
+    return {"$dateFromParts": parts}
+
+
+REBUILD_PIPELINE = [
+    {"$project": {
+        "party_id": 1,
+        "party_name": 1,
+        "order_type": 1,
+        "periods": [{"period": period, "bucket": _bucket_expr(period)} for period in PERIODS],
+        "lines": {"$concatArrays": [
+            [{
+                "product_id": None,
+                "product_name": None,
+                "count": 1,
+                "quantity": {"$sum": "$products.quantity"},
+                "total_price": "$total_price",
+                "total_weight": "$total_weight",
+            }],
+            {"$map": {
+                "input": {"$ifNull": ["$products", []]},
+                "as": "p",
+                "in": {
+                    "product_id": "$$p.product_id",
+                    "product_name": "$$p.product_name",
+                    "count": 1,
+                    "quantity": "$$p.quantity",
+                    "total_price": {"$multiply": ["$$p.quantity", "$$p.price"]},
+                    "total_weight": {"$multiply": ["$$p.quantity", "$$p.weight"]},
+                },
+            }},
+        ]},
+    }},
+    {"$unwind": "$periods"},
+    {"$unwind": "$lines"},
+    {"$group": {
+        "_id": {
+            "period": "$periods.period",
+            "party_id": "$party_id",
+            "product_id": "$lines.product_id",
+            "bucket": "$periods.bucket",
+            "order_type": "$order_type",
+        },
+        "party_name": {"$last": "$party_name"},
+        "product_name": {"$last": "$lines.product_name"},
+        **{name: {"$sum": f"$lines.{name}"} for name in MEASURES},
+    }},
+    {"$project": {
+        "_id": 0,
+        "period": "$_id.period",
+        "party_id": "$_id.party_id",
+        "product_id": "$_id.product_id",
+        "bucket": "$_id.bucket",
+        "order_type": "$_id.order_type",
+        "party_name": 1,
+        "product_name": 1,
+        **{name: 1 for name in MEASURES},
+    }},
+    {"$out": "rollups"},
+]
+
+
+async def rebuild_rollups(db) -> int:
+    """Regenerate the rollups from the orders in one aggregation.
+
+    $out swaps the collection in atomically and keeps its indexes. Orders
+    written while it runs may be missed, so run it when writes are quiet.
+    """
+    await db.orders.aggregate(REBUILD_PIPELINE, allowDiskUse=True).to_list(None)
+    await db.rollups.create_indexes(INDEXES["rollups"])
+    return await db.rollups.count_documents({})
+
+
+async def summarize(
+    db,
+    period: str,
+    group_by: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    party_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    order_type: Optional[str] = None,
+) -> List[dict]:
+    """Totals per ``group_by`` key and order type over the buckets from start to end.
+
+    Both ends are inclusive at bucket granularity: a month summary ending on
+    the 10th includes that whole month.
+    """
+    match = {"period": period}
+    if party_id:
+        match["party_id"] = party_id
+    if product_id:
+        match["product_id"] = product_id
+    elif group_by == "product":
+        match["product_id"] = {"$ne": None}
+    else:
+        match["product_id"] = None
+    bucket = {}
+    if start:
+        bucket["$gte"] = period_start(start, period)
+    if end:
+        bucket["$lte"] = period_start(end, period)
+    if bucket:
+        match["bucket"] = bucket
+    if order_type:
+        match["order_type"] = order_type
+
+    key_field, name_field = GROUP_BY[group_by]
+    group = {
+        "_id": {"key": f"${key_field}", "order_type": "$order_type"},
+        **{name: {"$sum": f"${name}"} for name in MEASURES},
+    }
+    if name_field:
+        group["name"] = {"$last": f"${name_field}"}
+    pipeline = [
+        {"$match": match},
+        {"$group": group},
+        # Products edited out of every order leave zeroed documents behind
+        {"$match": {"count": {"$ne": 0}}},
+        {"$sort": {"_id.key": 1, "_id.order_type": 1}},
+    ]
+    rows = []
+    async for row in db.rollups.aggregate(pipeline):
+        key = row["_id"]["key"]
+        rows.append({
+            "key": key.isoformat() if isinstance(key, datetime) else key,
+            "name": row.get("name"),
+            "order_type": row["_id"]["order_type"],
+            **{name: row[name] for name in MEASURES},
+        })
+    return rows
@@ -0,0 +1,70 @@
+import unicodedata
+from typing import Dict, List
+
+from pymongo import ASCENDING, UpdateOne
+
+
+# Typeahead search over party and product names. Each document stores
+# name_terms: the case-folded, accent-stripped name from every word onwards
+# ("Ravi Sharma" -> ["ravi sharma", "sharma"]), under a multikey index, so a
+# prefix of any word is one index range scan.
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+# Index entries read per query before ranking
+CANDIDATE_LIMIT = 200
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def search_terms(name: str) -> List[str]:
+    words = normalize(name).split()
+    return list(dict.fromkeys(" ".join(words[i:]) for i in range(len(words))))
+
+
+def prefix_filter(prefix: str) -> dict:
+    # Every string starting with prefix sorts in [prefix, prefix + U+10FFFF).
+    # $elemMatch makes one term satisfy both bounds, which also lets the
+    # planner intersect them on the multikey index.
+    return {"name_terms": {"$elemMatch": {"$gte": prefix, "$lt": prefix + "\U0010ffff"}}}
+
+
+def _rank(doc: dict, prefix: str):
+    # Whole-name prefix matches first, then word matches; shorter names first
+    name = normalize(doc["name"])
+    return (not name.startswith(prefix), len(name), name)
+
+
+async def prefix_search(collection, q: str, limit: int, projection: Dict[str, int]) -> List[dict]:
+    prefix = normalize(q)
+    if not prefix:
+        return []
+    # Sorted on the index key so the limit takes the first CANDIDATE_LIMIT
+    # index entries, as the party_search/product_search canonical queries do
+    candidates = await collection.find(
+        prefix_filter(prefix), {**projection, "name": 1}
+    ).sort("name_terms", ASCENDING).limit(CANDIDATE_LIMIT).to_list(None)
+    candidates.sort(key=lambda doc: _rank(doc, prefix))
+    return candidates[:limit]
+
+
+async def backfill_search_terms(collection) -> int:
+    """Set name_terms on documents created before search existed."""
+    updated = 0
+    requests = []
+    async for doc in collection.find({"name_terms": {"$exists": False}}, {"name": 1}):
+        requests.append(UpdateOne(
+            {"_id": doc["_id"]}, {"$set": {"name_terms": search_terms(doc.get("name", ""))}}
+        ))
+        if len(requests) >= BACKFILL_BATCH_SIZE:
+            await collection.bulk_write(requests, ordered=False)
+            updated += len(requests)
+            requests = []
+    if requests:
+        await collection.bulk_write(requests, ordered=False)
+        updated += len(requests)
+    return updated
@@ -0,0 +1,84 @@
+import math
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+OPEN_STATUSES = ["start", "inprocess"]
+
+
+def _priority_key(party_id: str) -> str:
+    return f"order_priority:{party_id}"
+
+
+async def _seed_value(db, party_id: str) -> int:
+    # First allocation for a party: start above whatever is already queued
+    top = await db.orders.find_one(
+        {"party_id": party_id, "status": {"$in": OPEN_STATUSES}},
+        {"priority": 1},
+        sort=[("priority", -1)]
+    )
+    return math.floor(top["priority"]) + 1 if top else 0
+
+
+async def allocate_priorities(db, party_id: str, count: int = 1) -> int:
+    """Reserve ``count`` consecutive order priorities for a party.
+
+    Returns the first value of the block. This is one atomic $inc on the
+    party's counter document, so concurrent creates never share a value. Rebalancing can
+    reset the counter, so the sequence may have gaps but always moves forward
+    past the open queue.
+    """
+    key = _priority_key(party_id)
+    counter = await db.counters.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"seq": count}},
+        return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        seed = await _seed_value(db, party_id)
+        try:
+            counter = await db.counters.find_one_and_update(
+                {"_id": key},
+                [{"$set": {"seq": {"$add": [{"$ifNull": ["$seq", seed]}, count]}}}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another request created the counter first
+            counter = await db.counters.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"seq": count}},
+                return_document=ReturnDocument.AFTER
+            )
+    return counter["seq"] - count
+
+
+async def current_sequence(db, party_id: str) -> Optional[int]:
+    counter = await db.counters.find_one({"_id": _priority_key(party_id)})
+    return counter["seq"] if counter else None
+
+
+async def reset_sequence(db, party_id: str, expected: Optional[int], value: int) -> bool:
+    """Move the counter back to ``value`` if nothing was allocated since ``expected`` was read."""
+    if expected is None:
+        return False
+    result = await db.counters.update_one(
+        {"_id": _priority_key(party_id), "seq": expected},
+        {"$set": {"seq": value}}
+    )
+    return result.modified_count == 1
+
+
+async def force_sequence(db, party_id: str, ceiling: int, value: int) -> bool:
+    """Move the counter back to ``value`` if it has passed ``ceiling``.
+
+    Unlike reset_sequence this doesn't care what was allocated meanwhile, so
+    concurrent allocations can't keep it from happening.
+    """
+    result = await db.counters.update_one(
+        {"_id": _priority_key(party_id), "seq": {"$gt": ceiling}},
+        {"$set": {"seq": value}}
+    )
+    return result.modified_count == 1
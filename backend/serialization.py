@@ -0,0 +1,164 @@
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Type, Union, get_args, get_origin
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson, which handles datetime natively."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    # Mongo projection returning only the fields the model exposes
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+class DocShape:
+    """What the fast path needs to shape a document the way its model would.
+
+    Static defaults and default factories for missing fields, the float
+    fields whose int values get coerced, and the shapes of nested models,
+    single or in a list.
+    """
+
+    __slots__ = ("defaults", "factories", "floats", "nested")
+
+    def __init__(
+        self,
+        defaults: Optional[Dict[str, Any]] = None,
+        factories: Optional[Dict[str, Callable[[], Any]]] = None,
+        floats: FrozenSet[str] = frozenset(),
+        nested: Optional[Dict[str, "DocShape"]] = None,
+    ):
+        self.defaults = defaults or {}
+        self.factories = factories or {}
+        self.floats = floats
+        self.nested = nested or {}
+
+
+PLAIN = DocShape()
+
+
+def _unwrap(annotation):
+    # Optional[X] -> X
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def model_shape(model: Type[BaseModel]) -> DocShape:
+    defaults, factories, floats, nested = {}, {}, set(), {}
+    for name, field in model.model_fields.items():
+        if name == "id":
+            continue
+        annotation = _unwrap(field.annotation)
+        if annotation is float:
+            floats.add(name)
+        elif _is_model(annotation):
+            nested[name] = model_shape(annotation)
+        elif get_origin(annotation) is list and _is_model(_unwrap(get_args(annotation)[0])):
+            nested[name] = model_shape(_unwrap(get_args(annotation)[0]))
+        if field.is_required():
+            continue
+        if field.default_factory is None:
+            defaults[name] = field.default
+        else:
+            factories[name] = field.default_factory
+    return DocShape(defaults, factories, frozenset(floats), nested)
+
+
+def _shape_value(shape: DocShape, name: str, value):
+    # pydantic turns ints stored in float fields into floats; so does this
+    if type(value) is int and name in shape.floats:
+        return float(value)
+    nested = shape.nested.get(name)
+    if nested is not None:
+        if isinstance(value, list):
+            return [_shape_doc(item, nested, {}) for item in value]
+        if isinstance(value, dict):
+            return _shape_doc(value, nested, {})
+    return value
+
+
+def _missing_value(shape: DocShape, name: str):
+    if name in shape.defaults:
+        return shape.defaults[name]
+    value = shape.factories[name]()
+    return value.model_dump() if isinstance(value, BaseModel) else value
+
+
+def _shape_doc(doc: dict, shape: DocShape, out: dict) -> dict:
+    for key, value in doc.items():
+        if key != "_id":
+            out[key] = _shape_value(shape, key, value)
+    for key in shape.defaults:
+        if key not in out:
+            out[key] = shape.defaults[key]
+    for key in shape.factories:
+        if key not in out:
+            out[key] = _missing_value(shape, key)
+    return out
+
+
+def to_fast_doc(doc: dict, shape: DocShape = PLAIN) -> dict:
+    """Shape a projected Mongo document like the model's JSON output in one pass.
+
+    Ints in float fields become floats and missing fields get the model's
+    defaults, factories included. Returns a new dict so the source document
+    can be reused.
+    """
+    return _shape_doc(doc, shape, {"id": str(doc["_id"])})
+
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Sparse fieldset from a comma-separated ``fields`` parameter.
+
+    None means every field. id is always returned. Raises ValueError on
+    names the model doesn't have.
+    """
+    if fields is None:
+        return None
+    names = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = names - set(model.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return names - {"id"}
+
+
+def sparse_projection(fields: FrozenSet[str], *extra: str) -> Dict[str, int]:
+    # extra: fields the handler needs itself, such as the keyset sort field
+    return {name: 1 for name in fields.union(extra)} or {"_id": 1}
+
+
+def to_sparse_doc(doc: dict, fields: FrozenSet[str], shape: DocShape) -> dict:
+    out = {"id": str(doc["_id"])}
+    for name in fields:
+        if name in doc:
+            out[name] = _shape_value(shape, name, doc[name])
+        elif name in shape.defaults or name in shape.factories:
+            out[name] = _missing_value(shape, name)
+    return out
+
+
+def fast_page(docs: List[dict], next_cursor: Optional[str], shape: DocShape) -> dict:
+    return {
+        "items": [to_fast_doc(doc, shape) for doc in docs],
+        "next_cursor": next_cursor,
+    }
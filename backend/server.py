@@ -1,26 +1,189 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, Generic, List, Optional, TypeVar
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from cache import TTLCache
+from idempotency import MAX_KEY_LENGTH, IdempotencyStore, KeyReused, RequestInProgress, fingerprint
+from export import CURSOR_BATCH_SIZE, EXPORT_COLUMNS, EXPORT_FORMATS, export_stream
+from indexes import ensure_indexes, explain_queries
+from compression import CompressionMiddleware
+from events import EventBroker, make_event, sse_frames, supports_change_streams, watch_changes
+from metrics import CommandMetrics, MetricsRegistry, RequestMetricsMiddleware
+from mongo import MongoSettings, PoolMonitor, ping_latency_ms, warm_pool
+from outbox import Outbox
+from pricing import PRICING_MODES, PricingError, load_catalog, lookup_ids, order_totals, price_lines
+from reconcile import CHUNK_SIZE, CONCURRENCY, reconcile_balances, resume_run, start_run
+from rollups import GROUP_BY, PERIODS, rebuild_rollups, record_orders, record_product_edit, summarize
+from search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, backfill_search_terms, prefix_search, search_terms
+from stock import completed_moves, created_moves, edited_moves, recompute_stock, record_stock
+from sync import (
+    DEFAULT_SYNC_LIMIT,
+    MAX_SYNC_LIMIT,
+    TOMBSTONE_RETENTION,
+    backfill_sync_seq,
+    changes_since,
+    decode_sync_token,
+    encode_sync_token,
+    record_tombstone,
+    sync_clock,
+)
+from ordering import (
+    COMPLETED_PRIORITY,
+    OPEN_STATUSES,
+    claim_priorities,
+    key_between,
+    needs_rebalance,
+    plan_reorder,
+    rebalance_open_orders,
+    schedule_rebalance,
+)
+from statement import party_statement
+from versions import VersionRegistry, etag_matches
+from serialization import (
+    FastJSONResponse,
+    fast_page,
+    model_projection,
+    model_shape,
+    parse_fields,
+    sparse_projection,
+    to_fast_doc,
+    to_sparse_doc,
+)
+from pagination import (
+    ASCENDING,
+    DESCENDING,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    paginate,
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened and closed by the app lifespan
+mongo_settings = MongoSettings.from_env()
+pool_monitor = PoolMonitor()
+client = None
+db = None
+
+MAX_BATCH_SIZE = 1000
+
+# Serve reads through the projection + orjson path instead of building models
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+# Read-through caches for rarely changing data. Balances are never cached.
+product_cache = TTLCache(
+    maxsize=int(os.environ.get('PRODUCT_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('PRODUCT_CACHE_TTL', 300)),
+)
+party_meta_cache = TTLCache(
+    maxsize=int(os.environ.get('PARTY_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PARTY_CACHE_TTL', 300)),
+)
+# Product typeahead results, kept apart so per-keystroke queries can't
+# evict the product pages and pricing entries in product_cache
+search_cache = TTLCache(
+    maxsize=int(os.environ.get('SEARCH_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 300)),
+)
+# Party typeahead results; cleared when a party is created or deleted
+party_search_cache = TTLCache(
+    maxsize=int(os.environ.get('PARTY_SEARCH_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('PARTY_SEARCH_CACHE_TTL', 300)),
+)
+
+# Stored responses for Idempotency-Key retries of the create routes
+idempotency = IdempotencyStore(
+    cache_size=int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000)),
+    cache_ttl=float(os.environ.get('IDEMPOTENCY_CACHE_TTL', 600)),
+)
+
+# How order lines are priced against the products collection; see pricing.py
+PRICING_MODE = os.environ.get('PRICING_MODE', 'check').lower()
+if PRICING_MODE not in PRICING_MODES:
+    raise ValueError(f"PRICING_MODE must be one of {', '.join(PRICING_MODES)}")
+
+# OUTBOX_MODE=async defers the material transaction and balance $inc of
+# POST /orders to the outbox workers; "sync" applies them before responding
+OUTBOX_MODE = os.environ.get('OUTBOX_MODE', 'sync').lower()
+
+def outbox_applied(transactions: List[dict]):
+    party_ids = {t["party_id"] for t in transactions}
+    versions.bump("material_transactions", "parties", *(
+        scope for party_id in party_ids
+        for scope in (("material_transactions", party_id), ("parties", party_id))
+    ))
+    event_broker.emit(
+        make_event("material_transactions", "created", t["_id"], t["party_id"], t)
+        for t in transactions
+    )
+
+outbox = Outbox(
+    workers=int(os.environ.get('OUTBOX_WORKERS', 4)),
+    batch_size=int(os.environ.get('OUTBOX_BATCH_SIZE', 200)),
+    on_applied=outbox_applied,
+)
+
+# Per-collection and per-party version counters behind the ETags of GET routes
+versions = VersionRegistry()
+
+# Request and MongoDB command metrics, exposed in Prometheus format at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+metrics_registry = MetricsRegistry()
+command_metrics = CommandMetrics(metrics_registry)
+
+# Live events for /api/stream. STREAM_SOURCE: "auto" uses a change stream when
+# the deployment supports one, "local" always publishes from the handlers
+STREAM_SOURCE = os.environ.get('STREAM_SOURCE', 'auto').lower()
+event_broker = EventBroker()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    client = AsyncIOMotorClient(
+        mongo_settings.url,
+        event_listeners=[pool_monitor, command_metrics] if METRICS_ENABLED else [pool_monitor],
+        **mongo_settings.client_kwargs()
+    )
+    db = client[mongo_settings.db_name]
+    await warm_pool(client, mongo_settings.min_pool_size)
+    await ensure_indexes(db)
+    await backfill_search_terms(db.parties)
+    await backfill_search_terms(db.products)
+    await backfill_sync_seq(db)
+    watcher = None
+    if STREAM_SOURCE == "auto" and await supports_change_streams(client):
+        watcher = asyncio.create_task(watch_changes(db, event_broker))
+    if OUTBOX_MODE == "async":
+        await outbox.start(db)
+    else:
+        # Orders an earlier async run left in the outbox still need applying
+        await outbox.recover(db)
+    yield
+    await outbox.stop()
+    if watcher is not None:
+        watcher.cancel()
+    client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -40,6 +203,12 @@ class ProductCreate(BaseModel):
     weight: float
     description: Optional[str] = ""
 
+class ProductMatch(BaseModel):
+    id: str
+    name: str
+    price: float
+    weight: float
+
 class Party(BaseModel):
     id: Optional[str] = None
     name: str
@@ -51,6 +220,11 @@ class PartyCreate(BaseModel):
     name: str
     contact: Optional[str] = ""
 
+class PartyMatch(BaseModel):
+    id: str
+    name: str
+    contact: Optional[str] = ""
+
 class OrderProduct(BaseModel):
     product_id: str
     product_name: str
@@ -58,6 +232,14 @@ class OrderProduct(BaseModel):
     price: float
     weight: float
 
+class OrderProductCreate(BaseModel):
+    # Missing name/price/weight are filled in from the product by the pricing stage
+    product_id: str
+    product_name: Optional[str] = None
+    quantity: float
+    price: Optional[float] = None
+    weight: Optional[float] = None
+
 class Order(BaseModel):
     id: Optional[str] = None
     party_id: str
@@ -67,7 +249,7 @@ class Order(BaseModel):
     total_price: float
     total_weight: float
     status: str = "start"  # "start", "inprocess", "completed"
-    priority: int = 0
+    priority: float = 0
     reference_order_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -75,13 +257,29 @@ class Order(BaseModel):
 class OrderCreate(BaseModel):
     party_id: str
     order_type: str
-    products: List[OrderProduct]
+    products: List[OrderProductCreate]
     reference_order_id: Optional[str] = None
 
+class OrderBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    order: Optional[Order] = None
+    error: Optional[str] = None
+
+class OrderBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItemResult]
+
 class OrderUpdate(BaseModel):
     status: Optional[str] = None
-    priority: Optional[int] = None
-    products: Optional[List[OrderProduct]] = None
+    priority: Optional[float] = None
+    products: Optional[List[OrderProductCreate]] = None
+
+class OrderMove(BaseModel):
+    # Place the order between after_id and before_id; either may be omitted
+    after_id: Optional[str] = None
+    before_id: Optional[str] = None
 
 class MaterialTransaction(BaseModel):
     id: Optional[str] = None
@@ -110,6 +308,113 @@ class FinancialTransactionCreate(BaseModel):
     payment_method: Optional[str] = "cash"
     description: Optional[str] = ""
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+class StatementEntry(BaseModel):
+    id: str
+    source: str  # "material" or "financial"
+    order_id: Optional[str] = None
+    order_type: Optional[str] = None
+    payment_type: Optional[str] = None
+    payment_method: Optional[str] = None
+    description: Optional[str] = ""
+    amount: float
+    balance_change: float
+    running_balance: float
+    created_at: datetime
+
+class PartyStatement(Page[StatementEntry]):
+    party_id: str
+    party_name: str
+    opening_balance: float
+
+class StatusTotals(BaseModel):
+    count: int
+    total_price: float
+    total_weight: float
+
+class PartyOverviewSummary(BaseModel):
+    open_orders: int
+    by_status: Dict[str, StatusTotals]
+
+class PartyOverview(BaseModel):
+    party: Party
+    orders: Page[Order]
+    material_transactions: Page[MaterialTransaction]
+    financial_transactions: Page[FinancialTransaction]
+    summary: PartyOverviewSummary
+
+class StockAmount(BaseModel):
+    quantity: float = 0.0
+    weight: float = 0.0
+
+class StockLevel(BaseModel):
+    id: Optional[str] = None  # the product id
+    product_name: Optional[str] = None
+    on_hand: StockAmount = Field(default_factory=StockAmount)
+    incoming: StockAmount = Field(default_factory=StockAmount)  # open purchase orders
+    reserved: StockAmount = Field(default_factory=StockAmount)  # open sale orders
+    updated_at: Optional[datetime] = None
+
+class StockMovement(BaseModel):
+    id: Optional[str] = None
+    product_id: str
+    product_name: str
+    order_id: str
+    party_id: str
+    order_type: str
+    event: str  # "created", "edited" or "completed"
+    on_hand: StockAmount
+    incoming: StockAmount
+    reserved: StockAmount
+    created_at: datetime
+
+class ReportRow(BaseModel):
+    key: Optional[str] = None
+    name: Optional[str] = None
+    order_type: str
+    count: int  # orders, or order lines when grouped by product
+    quantity: float
+    total_price: float
+    total_weight: float
+
+class ReportSummary(BaseModel):
+    period: str
+    group_by: str
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    rows: List[ReportRow]
+
+class SyncResponse(BaseModel):
+    token: str
+    has_more: bool
+    reset: bool  # the token was too old: drop local data and apply this as a full sync
+    changes: Dict[str, List[Dict[str, Any]]]
+    deleted: Dict[str, List[str]]
+
+READ_MODELS = (
+    Product, Party, Order, MaterialTransaction, FinancialTransaction, StockLevel, StockMovement,
+    PartyMatch, ProductMatch,
+)
+PROJECTIONS = {model: model_projection(model) for model in READ_MODELS}
+SHAPES = {model: model_shape(model) for model in READ_MODELS}
+SYNC_MODELS = {
+    "products": Product,
+    "parties": Party,
+    "orders": Order,
+    "material_transactions": MaterialTransaction,
+    "financial_transactions": FinancialTransaction,
+}
+EXPORT_MODELS = {
+    "orders": Order,
+    "material_transactions": MaterialTransaction,
+    "financial_transactions": FinancialTransaction,
+}
+
 
 # Helper function to convert ObjectId to string
 def object_id_to_str(doc):
@@ -119,29 +424,289 @@ def object_id_to_str(doc):
     return doc
 
 
+# Helper for conditional GETs: answers 304 when If-None-Match matches the
+# current versions of the given scopes, otherwise sets the ETag header.
+# Call it before querying Mongo.
+def conditional_get(request: Request, response: Response, *scopes):
+    etag = versions.etag(f"{request.url.path}?{request.url.query}", *scopes)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+
+# Helper to fetch one keyset page, mapping a bad cursor to a 400
+async def fetch_page(collection, query, sort_field, direction, limit, cursor, projection=None):
+    try:
+        return await paginate(collection, query, sort_field, direction, limit, cursor, projection)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Helpers for the fields= parameter of read routes: the requested subset of
+# the model's fields, or None for all of them, and the matching projection
+def requested_fields(model, fields: Optional[str]):
+    try:
+        return parse_fields(model, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def read_projection(model, fields, *sort_fields):
+    if fields is None:
+        return PROJECTIONS[model]
+    return sparse_projection(fields, *sort_fields)
+
+
+# Helpers shaping read responses. In fast mode documents go out as plain
+# dicts encoded by orjson, skipping model construction and response_model
+# validation; the declared response_model still documents the schema.
+# Sparse fieldsets always take the dict path, since they don't fit the model.
+def build_page(model, docs, next_cursor, fields=None):
+    if fields is not None:
+        return {
+            "items": [to_sparse_doc(d, fields, SHAPES[model]) for d in docs],
+            "next_cursor": next_cursor,
+        }
+    if FAST_RESPONSES:
+        return fast_page(docs, next_cursor, SHAPES[model])
+    return Page[model](
+        items=[model(**object_id_to_str(d)) for d in docs],
+        next_cursor=next_cursor,
+    )
+
+def build_item(model, doc, fields=None):
+    if fields is not None:
+        return to_sparse_doc(doc, fields, SHAPES[model])
+    if FAST_RESPONSES:
+        return to_fast_doc(doc, SHAPES[model])
+    return model(**object_id_to_str(doc))
+
+def respond(response: Response, content):
+    # Returning a Response bypasses FastAPI's header merge, so carry the ETag over
+    if isinstance(content, dict):
+        return FastJSONResponse(content, headers=dict(response.headers))
+    return content
+
+
+# Helper to insert {batch index: document} in one round trip, recording
+# per-item failures in errors instead of aborting the batch
+async def bulk_insert(collection, docs_by_index: dict, errors: dict):
+    indexes = [idx for idx in docs_by_index if idx not in errors]
+    if not indexes:
+        return
+    try:
+        await collection.insert_many([docs_by_index[idx] for idx in indexes], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            errors[indexes[write_error["index"]]] = write_error.get("errmsg", "Write failed")
+
+
+# Helpers to read party name/contact through party_meta_cache
+PARTY_META_PROJECTION = {"name": 1, "contact": 1}
+
+def party_meta(party: dict) -> dict:
+    return {"name": party["name"], "contact": party.get("contact", "")}
+
+async def get_party_meta(party_id: str) -> Optional[dict]:
+    found, meta = party_meta_cache.get(party_id)
+    if found:
+        return meta
+    party = await db.parties.find_one({"_id": ObjectId(party_id)}, PARTY_META_PROJECTION)
+    if not party:
+        return None
+    meta = party_meta(party)
+    party_meta_cache.set(party_id, meta)
+    return meta
+
+
+# Scopes whose data changes when an order is created for a party
+def order_created_scopes(party_id: str) -> list:
+    return [
+        "orders", ("orders", party_id),
+        "material_transactions", ("material_transactions", party_id),
+        "parties", ("parties", party_id),
+        "stock",
+    ]
+
+
+# Helper to rebalance a party's open queue off the request path
+def rebalance_later(party_id: str):
+    schedule_rebalance(db, party_id, on_done=rebalanced)
+
+def rebalanced(party_id: str, changed):
+    versions.bump("orders", ("orders", party_id))
+    event_broker.emit(
+        make_event("orders", "updated", oid, party_id, {"priority": priority})
+        for oid, priority in changed
+    )
+
+
+# Helper running a create route at most once per Idempotency-Key: a repeat
+# gets the first response back instead of writing again. ``create`` is given
+# the claim's _id to store as idempotency_key on the document it inserts into
+# the ``scope`` collection, which is how a takeover finds it.
+async def idempotent(scope: str, key: Optional[str], payload: BaseModel, model, create):
+    if key is None:
+        return await create(None)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+    request_hash = fingerprint(payload.model_dump_json().encode())
+    
+    async def recover(claim_id: str) -> Optional[dict]:
+        created = await db[scope].find_one({"idempotency_key": claim_id})
+        return model(**object_id_to_str(created)).model_dump() if created else None
+    
+    try:
+        stored = await idempotency.begin(db, scope, key, request_hash, recover)
+    except RequestInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+    except KeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was used for a different request")
+    if stored is not None:
+        return FastJSONResponse(stored, headers={"Idempotent-Replayed": "true"})
+    
+    try:
+        result = await create(f"{scope}:{key}")
+    except Exception:
+        await idempotency.release(db, scope, key)
+        raise
+    await idempotency.complete(db, scope, key, request_hash, result.model_dump())
+    return result
+
+
+# Helper pricing the lines of one or more orders with a single catalog read.
+# Returns one (lines, total_price, total_weight) per order, or the
+# PricingError that rejected it.
+async def price_orders(orders_lines: List[List[OrderProductCreate]]) -> list:
+    raw = [[line.model_dump() for line in lines] for lines in orders_lines]
+    catalog = await load_catalog(db, lookup_ids(raw, PRICING_MODE), product_cache)
+    priced = []
+    for lines in raw:
+        try:
+            priced.append(price_lines(lines, catalog, PRICING_MODE))
+        except PricingError as e:
+            priced.append(e)
+    totals = iter(order_totals([lines for lines in priced if not isinstance(lines, PricingError)]))
+    return [
+        lines if isinstance(lines, PricingError) else (lines, *next(totals))
+        for lines in priced
+    ]
+
+async def price_order(lines: List[OrderProductCreate]):
+    (result,) = await price_orders([lines])
+    if isinstance(result, PricingError):
+        raise HTTPException(status_code=422, detail=str(result))
+    return result
+
+
+# Helpers to build the documents written when an order is created
+def build_order_doc(order: OrderCreate, party_name: str, priority: float, priced: tuple) -> dict:
+    lines, total_price, total_weight = priced
+    now = datetime.utcnow()
+    return {
+        "party_id": order.party_id,
+        "party_name": party_name,
+        "order_type": order.order_type,
+        "products": lines,
+        "total_price": total_price,
+        "total_weight": total_weight,
+        "status": "start",
+        "priority": priority,
+        "reference_order_id": order.reference_order_id,
+        "created_at": now,
+        "updated_at": now
+    }
+
+def order_balance_change(order_dict: dict) -> float:
+    # Sale: party owes us more; purchase: we owe the party
+    return order_dict["total_price"] if order_dict["order_type"] == "sale" else -order_dict["total_price"]
+
+def build_material_transaction(order_dict: dict) -> dict:
+    return {
+        "party_id": order_dict["party_id"],
+        "party_name": order_dict["party_name"],
+        "order_id": order_dict["id"],
+        "order_type": order_dict["order_type"],
+        "amount": order_balance_change(order_dict),
+        "description": f"{order_dict['order_type'].capitalize()} order created",
+        "created_at": datetime.utcnow()
+    }
+
+
 # Products Routes
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
     product_dict = product.dict()
-    result = await db.products.insert_one(product_dict)
+    product_dict["name_terms"] = search_terms(product.name)
+    async with sync_clock.stamp(db) as seq:
+        product_dict["sync_seq"] = seq
+        result = await db.products.insert_one(product_dict)
     product_dict["id"] = str(result.inserted_id)
+    product_cache.clear()
+    search_cache.clear()
+    versions.bump("products")
     return Product(**product_dict)
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find().to_list(1000)
-    return [Product(**object_id_to_str(p)) for p in products]
+@api_router.get("/products", response_model=Page[Product])
+async def get_products(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    selected = requested_fields(Product, fields)
+    conditional_get(request, response, "products")
+    found, page = product_cache.get(("page", cursor, limit, selected))
+    if not found:
+        products, next_cursor = await fetch_page(
+            db.products, {}, None, ASCENDING, limit, cursor, read_projection(Product, selected)
+        )
+        page = build_page(Product, products, next_cursor, selected)
+        product_cache.set(("page", cursor, limit, selected), page)
+    return respond(response, page)
+
+@api_router.get("/products/search", response_model=List[ProductMatch])
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """Products with a name word starting with q, best matches first"""
+    conditional_get(request, response, "products")
+    found, matches = search_cache.get((q, limit))
+    if not found:
+        products = await prefix_search(db.products, q, limit, PROJECTIONS[ProductMatch])
+        matches = [build_item(ProductMatch, p) for p in products]
+        search_cache.set((q, limit), matches)
+    return matches
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**object_id_to_str(product))
+async def get_product(
+    product_id: str, request: Request, response: Response, fields: Optional[str] = None
+):
+    selected = requested_fields(Product, fields)
+    conditional_get(request, response, "products")
+    found, product = product_cache.get(("id", product_id, selected))
+    if not found:
+        product = await db.products.find_one(
+            {"_id": ObjectId(product_id)}, read_projection(Product, selected)
+        )
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product = build_item(Product, product, selected)
+        product_cache.set(("id", product_id, selected), product)
+    return respond(response, product)
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
-    result = await db.products.delete_one({"_id": ObjectId(product_id)})
+    async with sync_clock.stamp(db) as seq:
+        result = await db.products.delete_one({"_id": ObjectId(product_id)})
+        if result.deleted_count:
+            await record_tombstone(db, "products", product_id, seq)
+    product_cache.clear()
+    search_cache.clear()
+    versions.bump("products")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted"}
@@ -153,25 +718,175 @@ async def create_party(party: PartyCreate):
     party_dict = party.dict()
     party_dict["balance"] = 0.0
     party_dict["created_at"] = datetime.utcnow()
-    result = await db.parties.insert_one(party_dict)
+    party_dict["name_terms"] = search_terms(party.name)
+    async with sync_clock.stamp(db) as seq:
+        party_dict["sync_seq"] = seq
+        result = await db.parties.insert_one(party_dict)
     party_dict["id"] = str(result.inserted_id)
+    party_meta_cache.invalidate(party_dict["id"])
+    party_search_cache.clear()
+    versions.bump("parties")
     return Party(**party_dict)
 
-@api_router.get("/parties", response_model=List[Party])
-async def get_parties():
-    parties = await db.parties.find().to_list(1000)
-    return [Party(**object_id_to_str(p)) for p in parties]
+@api_router.get("/parties", response_model=Page[Party])
+async def get_parties(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    selected = requested_fields(Party, fields)
+    conditional_get(request, response, "parties")
+    parties, next_cursor = await fetch_page(
+        db.parties, {}, "created_at", ASCENDING, limit, cursor,
+        read_projection(Party, selected, "created_at")
+    )
+    return respond(response, build_page(Party, parties, next_cursor, selected))
+
+@api_router.get("/parties/search", response_model=List[PartyMatch])
+async def search_parties(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """Parties with a name word starting with q, best matches first"""
+    conditional_get(request, response, "parties")
+    found, matches = party_search_cache.get((q, limit))
+    if not found:
+        parties = await prefix_search(db.parties, q, limit, PROJECTIONS[PartyMatch])
+        matches = [build_item(PartyMatch, p) for p in parties]
+        party_search_cache.set((q, limit), matches)
+    return matches
 
 @api_router.get("/parties/{party_id}", response_model=Party)
-async def get_party(party_id: str):
-    party = await db.parties.find_one({"_id": ObjectId(party_id)})
+async def get_party(
+    party_id: str, request: Request, response: Response, fields: Optional[str] = None
+):
+    selected = requested_fields(Party, fields)
+    conditional_get(request, response, ("parties", party_id))
+    party = await db.parties.find_one({"_id": ObjectId(party_id)}, read_projection(Party, selected))
+    if not party:
+        raise HTTPException(status_code=404, detail="Party not found")
+    return respond(response, build_item(Party, party, selected))
+
+@api_router.get("/parties/{party_id}/statement", response_model=PartyStatement)
+async def get_party_statement(
+    party_id: str,
+    request: Request,
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Material and financial ledger of a party, oldest first, with running balance"""
+    conditional_get(
+        request, response,
+        ("material_transactions", party_id), ("financial_transactions", party_id)
+    )
+    party = await get_party_meta(party_id)
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
-    return Party(**object_id_to_str(party))
+    
+    try:
+        opening_balance, entries, next_cursor = await party_statement(
+            db, party_id, start_date, end_date, limit, cursor
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return PartyStatement(
+        party_id=party_id,
+        party_name=party["name"],
+        opening_balance=opening_balance,
+        items=[StatementEntry(**object_id_to_str(e)) for e in entries],
+        next_cursor=next_cursor,
+    )
+
+@api_router.get("/parties/{party_id}/overview", response_model=PartyOverview)
+async def get_party_overview(
+    party_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Party header, first page of orders and both ledgers, and order totals in one call.
+
+    The queries run concurrently. The returned cursors continue on the
+    matching list routes filtered by party_id.
+    """
+    conditional_get(
+        request, response,
+        ("parties", party_id), ("orders", party_id),
+        ("material_transactions", party_id), ("financial_transactions", party_id)
+    )
+    
+    query = {"party_id": party_id}
+    party, orders, material, financial, facets = await asyncio.gather(
+        db.parties.find_one({"_id": ObjectId(party_id)}, PROJECTIONS[Party]),
+        fetch_page(db.orders, query, "priority", ASCENDING, limit, None, PROJECTIONS[Order]),
+        fetch_page(
+            db.material_transactions, query, "created_at", DESCENDING, limit, None,
+            PROJECTIONS[MaterialTransaction]
+        ),
+        fetch_page(
+            db.financial_transactions, query, "created_at", DESCENDING, limit, None,
+            PROJECTIONS[FinancialTransaction]
+        ),
+        db.orders.aggregate([
+            {"$match": query},
+            {"$facet": {
+                "open": [
+                    {"$match": {"status": {"$in": ["start", "inprocess"]}}},
+                    {"$count": "count"},
+                ],
+                "by_status": [
+                    {"$group": {
+                        "_id": "$status",
+                        "count": {"$sum": 1},
+                        "total_price": {"$sum": "$total_price"},
+                        "total_weight": {"$sum": "$total_weight"},
+                    }},
+                ],
+            }},
+        ]).to_list(1),
+    )
+    if not party:
+        raise HTTPException(status_code=404, detail="Party not found")
+    
+    facets = facets[0]
+    overview = {
+        "party": build_item(Party, party),
+        "orders": build_page(Order, *orders),
+        "material_transactions": build_page(MaterialTransaction, *material),
+        "financial_transactions": build_page(FinancialTransaction, *financial),
+        "summary": {
+            "open_orders": facets["open"][0]["count"] if facets["open"] else 0,
+            "by_status": {
+                row["_id"]: {
+                    "count": row["count"],
+                    "total_price": float(row["total_price"]),
+                    "total_weight": float(row["total_weight"]),
+                }
+                for row in facets["by_status"]
+            },
+        },
+    }
+    if FAST_RESPONSES:
+        return respond(response, overview)
+    return PartyOverview(**overview)
 
 @api_router.delete("/parties/{party_id}")
 async def delete_party(party_id: str):
-    result = await db.parties.delete_one({"_id": ObjectId(party_id)})
+    async with sync_clock.stamp(db) as seq:
+        result = await db.parties.delete_one({"_id": ObjectId(party_id)})
+        if result.deleted_count:
+            await record_tombstone(db, "parties", party_id, seq)
+    party_meta_cache.invalidate(party_id)
+    party_search_cache.clear()
+    versions.bump("parties", ("parties", party_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Party not found")
     return {"message": "Party deleted"}
@@ -179,78 +894,252 @@ async def delete_party(party_id: str):
 
 # Orders Routes
 @api_router.post("/orders", response_model=Order)
-async def create_order(order: OrderCreate):
+async def create_order(order: OrderCreate, idempotency_key: Optional[str] = Header(None)):
+    return await idempotent("orders", idempotency_key, order, Order, lambda tag: place_order(order, tag))
+
+async def place_order(order: OrderCreate, idempotency_tag: Optional[str] = None) -> Order:
     # Get party details
-    party = await db.parties.find_one({"_id": ObjectId(order.party_id)})
+    party = await get_party_meta(order.party_id)
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
+    priced = await price_order(order.products)
     
-    # Calculate totals
-    total_price = sum(p.quantity * p.price for p in order.products)
-    total_weight = sum(p.quantity * p.weight for p in order.products)
+    # Next priority for this party, allocated atomically
+    priority = await claim_priorities(db, order.party_id)
     
-    # Get max priority for this party
-    max_priority_order = await db.orders.find_one(
-        {"party_id": order.party_id, "status": {"$in": ["start", "inprocess"]}},
-        sort=[("priority", -1)]
-    )
-    priority = (max_priority_order["priority"] + 1) if max_priority_order else 0
+    order_dict = build_order_doc(order, party["name"], priority, priced)
+    if idempotency_tag:
+        order_dict["idempotency_key"] = idempotency_tag
+    if OUTBOX_MODE == "async":
+        return await place_order_deferred(order_dict, priority)
     
-    order_dict = {
-        "party_id": order.party_id,
-        "party_name": party["name"],
-        "order_type": order.order_type,
-        "products": [p.dict() for p in order.products],
-        "total_price": total_price,
-        "total_weight": total_weight,
-        "status": "start",
-        "priority": priority,
-        "reference_order_id": order.reference_order_id,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
+    # Order, material transaction and party balance
+    async with sync_clock.stamp(db, 3) as seq:
+        order_dict["sync_seq"] = seq
+        result = await db.orders.insert_one(order_dict)
+        order_dict["id"] = str(result.inserted_id)
+        
+        # Create material transaction
+        material_transaction = build_material_transaction(order_dict)
+        material_transaction["sync_seq"] = seq + 1
+        await db.material_transactions.insert_one(material_transaction)
+        await record_orders(db, [order_dict])
+        await record_stock(db, [(order_dict, "created", created_moves(order_dict))])
+        
+        # Update party balance
+        await db.parties.update_one(
+            {"_id": ObjectId(order.party_id)},
+            {"$inc": {"balance": material_transaction["amount"]}, "$set": {"sync_seq": seq + 2}}
+        )
+    versions.bump(*order_created_scopes(order.party_id))
+    event_broker.emit([
+        make_event("orders", "created", order_dict["id"], order.party_id, order_dict),
+        make_event(
+            "material_transactions", "created", material_transaction["_id"],
+            order.party_id, material_transaction
+        ),
+    ])
+    if needs_rebalance(None, None, priority):
+        rebalance_later(order.party_id)
     
-    result = await db.orders.insert_one(order_dict)
-    order_dict["id"] = str(result.inserted_id)
+    return Order(**order_dict)
+
+async def place_order_deferred(order_dict: dict, priority: float) -> Order:
+    # The order carries its material transaction in the outbox field; the
+    # outbox workers insert it and apply the balance $inc
+    party_id = order_dict["party_id"]
+    order_dict["_id"] = ObjectId()
+    material_transaction = build_material_transaction({**order_dict, "id": str(order_dict["_id"])})
+    material_transaction["_id"] = ObjectId()
+    entry = outbox.entry(material_transaction)
+    order_dict["outbox"] = entry
     
-    # Create material transaction
-    transaction_amount = total_price if order.order_type == "sale" else -total_price
-    material_transaction = {
-        "party_id": order.party_id,
-        "party_name": party["name"],
-        "order_id": order_dict["id"],
-        "order_type": order.order_type,
-        "amount": transaction_amount,
-        "description": f"{order.order_type.capitalize()} order created",
-        "created_at": datetime.utcnow()
-    }
-    await db.material_transactions.insert_one(material_transaction)
+    async with sync_clock.stamp(db) as seq:
+        order_dict["sync_seq"] = seq
+        await db.orders.insert_one(order_dict)
+    outbox.notify(entry)
+    order_dict["id"] = str(order_dict["_id"])
+    await record_orders(db, [order_dict])
+    await record_stock(db, [(order_dict, "created", created_moves(order_dict))])
     
-    # Update party balance
-    await db.parties.update_one(
-        {"_id": ObjectId(order.party_id)},
-        {"$inc": {"balance": transaction_amount}}
-    )
+    versions.bump("orders", ("orders", party_id), "stock")
+    event_broker.emit([make_event("orders", "created", order_dict["id"], party_id, order_dict)])
+    if needs_rebalance(None, None, priority):
+        rebalance_later(party_id)
     
     return Order(**order_dict)
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(party_id: Optional[str] = None, order_type: Optional[str] = None):
+@api_router.post("/orders/batch", response_model=OrderBatchResult)
+async def create_orders_batch(orders: List[OrderCreate]):
+    """Create many orders with a fixed number of round trips.
+
+    Parties and products are resolved with one $in query each, and each
+    party reserves a block of priorities with one atomic $inc, run
+    concurrently. Orders and material transactions are then
+    bulk-inserted and each party's balance gets one aggregated $inc. Items
+    that fail are reported individually and leave no side effects: an order
+    whose material transaction fails to insert is deleted again.
+    """
+    if len(orders) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} orders per batch")
+    
+    errors = {}
+    party_oids = {}
+    for idx, order in enumerate(orders):
+        try:
+            party_oids[order.party_id] = ObjectId(order.party_id)
+        except InvalidId:
+            errors[idx] = "Invalid party id"
+    
+    # Cached parties first, then one $in query for the rest
+    party_names = {}
+    missing = []
+    for party_id, oid in party_oids.items():
+        found, meta = party_meta_cache.get(party_id)
+        if found:
+            party_names[party_id] = meta["name"]
+        else:
+            missing.append(oid)
+    if missing:
+        parties = await db.parties.find(
+            {"_id": {"$in": missing}}, PARTY_META_PROJECTION
+        ).to_list(None)
+        for p in parties:
+            meta = party_meta(p)
+            party_meta_cache.set(str(p["_id"]), meta)
+            party_names[str(p["_id"])] = meta["name"]
+    
+    # Every order's lines priced with one catalog read
+    priced = await price_orders([order.products for order in orders])
+    for idx, result in enumerate(priced):
+        if idx not in errors and isinstance(result, PricingError):
+            errors[idx] = str(result)
+    
+    counts = defaultdict(int)
+    for idx, order in enumerate(orders):
+        if idx in errors:
+            continue
+        if order.party_id not in party_names:
+            errors[idx] = "Party not found"
+            continue
+        counts[order.party_id] += 1
+    
+    # Reserve a block of priorities per party, then assign them in request order
+    blocks = await asyncio.gather(*(
+        claim_priorities(db, party_id, count) for party_id, count in counts.items()
+    ))
+    next_priority = dict(zip(counts, blocks))
+    
+    # One sync_seq block for the orders, their material transactions and the parties
+    async with sync_clock.stamp(db, 2 * sum(counts.values()) + len(counts)) as seq:
+        order_docs = {}
+        for idx, order in enumerate(orders):
+            if idx in errors:
+                continue
+            priority = next_priority[order.party_id]
+            next_priority[order.party_id] = priority + 1
+            order_dict = build_order_doc(order, party_names[order.party_id], priority, priced[idx])
+            order_dict["_id"] = ObjectId()
+            order_dict["sync_seq"] = seq
+            seq += 1
+            order_docs[idx] = order_dict
+    
+        await bulk_insert(db.orders, order_docs, errors)
+    
+        material_transactions = {}
+        for idx, order_dict in order_docs.items():
+            if idx not in errors:
+                order_dict["id"] = str(order_dict["_id"])
+                material_transactions[idx] = build_material_transaction(order_dict)
+                material_transactions[idx]["sync_seq"] = seq
+                seq += 1
+        await bulk_insert(db.material_transactions, material_transactions, errors)
+        # Still unseen by sync: the watermark stays below this block
+        orphaned = [order_docs[idx]["_id"] for idx in material_transactions if idx in errors]
+        if orphaned:
+            await db.orders.delete_many({"_id": {"$in": orphaned}})
+    
+        # One $inc per party for everything that was fully recorded
+        balance_changes = defaultdict(float)
+        for idx, transaction in material_transactions.items():
+            if idx not in errors:
+                balance_changes[transaction["party_id"]] += transaction["amount"]
+        recorded = [order_docs[idx] for idx in material_transactions if idx not in errors]
+        await record_orders(db, recorded)
+        await record_stock(db, [(order_dict, "created", created_moves(order_dict)) for order_dict in recorded])
+        if balance_changes:
+            await db.parties.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": party_oids[party_id]},
+                        {"$inc": {"balance": amount}, "$set": {"sync_seq": seq + i}}
+                    )
+                    for i, (party_id, amount) in enumerate(balance_changes.items())
+                ],
+                ordered=False
+            )
+    event_broker.emit(
+        make_event("orders", "created", order_dict["id"], order_dict["party_id"], order_dict)
+        for order_dict in recorded
+    )
+    event_broker.emit(
+        make_event("material_transactions", "created", transaction["_id"], transaction["party_id"], transaction)
+        for idx, transaction in material_transactions.items()
+        if idx not in errors
+    )
+    for party_id in balance_changes:
+        versions.bump(*order_created_scopes(party_id))
+        if needs_rebalance(None, None, next_priority[party_id]):
+            rebalance_later(party_id)
+    
+    results = []
+    for idx in range(len(orders)):
+        if idx in errors:
+            results.append(OrderBatchItemResult(index=idx, success=False, error=errors[idx]))
+        else:
+            order_dict = object_id_to_str(order_docs[idx])
+            results.append(OrderBatchItemResult(index=idx, success=True, order=Order(**order_dict)))
+    return OrderBatchResult(
+        created=len(orders) - len(errors),
+        failed=len(errors),
+        results=results,
+    )
+
+@api_router.get("/orders", response_model=Page[Order])
+async def get_orders(
+    request: Request,
+    response: Response,
+    party_id: Optional[str] = None,
+    order_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    selected = requested_fields(Order, fields)
+    conditional_get(request, response, ("orders", party_id) if party_id else "orders")
+    
     query = {}
     if party_id:
         query["party_id"] = party_id
     if order_type:
         query["order_type"] = order_type
     
-    orders = await db.orders.find(query).sort("priority", 1).to_list(1000)
-    return [Order(**object_id_to_str(o)) for o in orders]
+    orders, next_cursor = await fetch_page(
+        db.orders, query, "priority", ASCENDING, limit, cursor,
+        read_projection(Order, selected, "priority")
+    )
+    return respond(response, build_page(Order, orders, next_cursor, selected))
 
 @api_router.get("/orders/{order_id}", response_model=Order)
-async def get_order(order_id: str):
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+async def get_order(
+    order_id: str, request: Request, response: Response, fields: Optional[str] = None
+):
+    selected = requested_fields(Order, fields)
+    conditional_get(request, response, "orders")
+    order = await db.orders.find_one({"_id": ObjectId(order_id)}, read_projection(Order, selected))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return Order(**object_id_to_str(order))
+    return respond(response, build_item(Order, order, selected))
 
 @api_router.patch("/orders/{order_id}", response_model=Order)
 async def update_order(order_id: str, update: OrderUpdate):
@@ -267,95 +1156,636 @@ async def update_order(order_id: str, update: OrderUpdate):
     if update.status:
         update_dict["status"] = update.status
         
-        # If completing order, adjust priority
+        # If completing order, move it to the bottom. Open orders keep their
+        # fractional priorities, so nothing else needs renumbering.
         if update.status == "completed":
-            # Get all orders for this party
-            party_orders = await db.orders.find(
-                {"party_id": order["party_id"], "status": {"$in": ["start", "inprocess"]}}
-            ).to_list(1000)
-            
-            # Reorder priorities
-            for idx, po in enumerate(sorted(party_orders, key=lambda x: x["priority"])):
-                if str(po["_id"]) != order_id:
-                    await db.orders.update_one(
-                        {"_id": po["_id"]},
-                        {"$set": {"priority": idx}}
-                    )
-            
-            # Set completed order to high priority (will be at bottom)
-            update_dict["priority"] = 9999
+            update_dict["priority"] = COMPLETED_PRIORITY
     
     if update.priority is not None:
         update_dict["priority"] = update.priority
     
     if update.products:
-        total_price = sum(p.quantity * p.price for p in update.products)
-        total_weight = sum(p.quantity * p.weight for p in update.products)
-        update_dict["products"] = [p.dict() for p in update.products]
+        lines, total_price, total_weight = await price_order(update.products)
+        update_dict["products"] = lines
         update_dict["total_price"] = total_price
         update_dict["total_weight"] = total_weight
     
-    await db.orders.update_one({"_id": ObjectId(order_id)}, {"$set": update_dict})
+    # Conditional on the order still being open, so a concurrent completion
+    # can't move its stock twice. Rollup and stock deltas come from the
+    # document this update replaced, not the read above, so concurrent edits
+    # each take out the lines they actually overwrote.
+    async with sync_clock.stamp(db) as seq:
+        update_dict["sync_seq"] = seq
+        replaced = await db.orders.find_one_and_update(
+            {"_id": ObjectId(order_id), "status": {"$ne": "completed"}},
+            {"$set": update_dict},
+            return_document=ReturnDocument.BEFORE
+        )
+    if replaced is None:
+        raise HTTPException(status_code=400, detail="Cannot modify completed order")
     
-    updated_order = await db.orders.find_one({"_id": ObjectId(order_id)})
-    return Order(**object_id_to_str(updated_order))
+    stock_changes = []
+    if update.products:
+        await record_product_edit(db, replaced, update_dict["products"])
+        stock_changes.append((replaced, "edited", edited_moves(replaced, update_dict["products"])))
+    if update.status == "completed":
+        products = update_dict.get("products", replaced["products"])
+        stock_changes.append((replaced, "completed", completed_moves(replaced, products)))
+    if stock_changes:
+        await record_stock(db, stock_changes)
+        versions.bump("stock")
+    versions.bump("orders", ("orders", order["party_id"]))
+    event_broker.emit([make_event("orders", "updated", order_id, order["party_id"], update_dict)])
+    
+    return Order(**object_id_to_str({**replaced, **update_dict}))
 
 @api_router.post("/orders/reorder")
 async def reorder_orders(order_ids: List[str]):
     """Reorder orders based on provided list"""
-    for idx, order_id in enumerate(order_ids):
-        await db.orders.update_one(
-            {"_id": ObjectId(order_id)},
-            {"$set": {"priority": idx, "updated_at": datetime.utcnow()}}
+    if not order_ids:
+        return {"message": "Orders reordered successfully", "matched_count": 0, "modified_count": 0}
+    
+    try:
+        object_ids = [ObjectId(order_id) for order_id in order_ids]
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid order id")
+    if len(set(object_ids)) != len(object_ids):
+        raise HTTPException(status_code=400, detail="Duplicate order ids")
+    
+    # All orders must exist, be open and belong to the same party
+    orders = await db.orders.find(
+        {"_id": {"$in": object_ids}}, {"party_id": 1, "priority": 1, "status": 1}
+    ).to_list(None)
+    if len(orders) != len(object_ids):
+        raise HTTPException(status_code=404, detail="Order not found")
+    if any(o["status"] not in OPEN_STATUSES for o in orders):
+        raise HTTPException(status_code=400, detail="Only open orders can be moved")
+    if len({o["party_id"] for o in orders}) > 1:
+        raise HTTPException(status_code=400, detail="Orders belong to more than one party")
+    party_id = orders[0]["party_id"]
+    
+    # Only orders out of place get a new fractional priority; if some gap has
+    # no room left, renumber the submitted orders outright
+    current = {o["_id"]: o.get("priority", 0) for o in orders}
+    plan = plan_reorder([current[oid] for oid in object_ids])
+    if plan is None:
+        plan = list(range(len(object_ids)))
+    else:
+        # Orders moved past the last kept one go to the end of the queue, so
+        # they take fresh values from the party's priority sequence
+        tail = 0
+        while tail < len(plan) and plan[len(plan) - 1 - tail] is not None:
+            tail += 1
+        if tail:
+            start = await claim_priorities(db, party_id, tail)
+            plan[len(plan) - tail:] = [start + k for k in range(tail)]
+    
+    now = datetime.utcnow()
+    moves = [(oid, priority) for oid, priority in zip(object_ids, plan) if priority is not None]
+    if not moves:
+        return {"message": "Orders reordered successfully", "matched_count": 0, "modified_count": 0}
+    
+    # An order completed since the read above keeps COMPLETED_PRIORITY
+    async with sync_clock.stamp(db, len(moves)) as seq:
+        requests = [
+            UpdateOne(
+                {"_id": oid, "status": {"$in": OPEN_STATUSES}},
+                {"$set": {"priority": priority, "updated_at": now, "sync_seq": seq + i}}
+            )
+            for i, (oid, priority) in enumerate(moves)
+        ]
+        result = await db.orders.bulk_write(requests, ordered=True)
+    versions.bump("orders", ("orders", party_id))
+    event_broker.emit(
+        make_event("orders", "updated", oid, party_id, {"priority": priority, "updated_at": now})
+        for oid, priority in moves
+    )
+    if any(p is not None and needs_rebalance(None, None, p) for p in plan):
+        rebalance_later(party_id)
+    return {
+        "message": "Orders reordered successfully",
+        "matched_count": result.matched_count,
+        "modified_count": result.modified_count,
+    }
+
+
+# Helper returning the (lo, hi) priorities an order should be placed between
+async def move_bounds(order: dict, move: OrderMove, position: Optional[str]):
+    open_query = {
+        "party_id": order["party_id"],
+        "status": {"$in": OPEN_STATUSES},
+        "_id": {"$ne": order["_id"]},
+    }
+    if position == "top":
+        first = await db.orders.find_one(open_query, {"priority": 1}, sort=[("priority", 1), ("_id", 1)])
+        return None, first["priority"] if first else None
+    if position == "bottom":
+        last = await db.orders.find_one(open_query, {"priority": 1}, sort=[("priority", -1), ("_id", -1)])
+        return last["priority"] if last else None, None
+    
+    anchors = {}
+    for key in ("after_id", "before_id"):
+        anchor_id = getattr(move, key)
+        if anchor_id is None:
+            continue
+        try:
+            anchor_oid = ObjectId(anchor_id)
+        except InvalidId:
+            raise HTTPException(status_code=400, detail=f"Invalid {key}")
+        anchor = await db.orders.find_one({**open_query, "_id": anchor_oid}, {"priority": 1})
+        if anchor is None or anchor_oid == order["_id"]:
+            raise HTTPException(status_code=400, detail=f"{key} is not another open order of this party")
+        anchors[key] = anchor
+    
+    after, before = anchors.get("after_id"), anchors.get("before_id")
+    if after and before:
+        if (after["priority"], after["_id"]) >= (before["priority"], before["_id"]):
+            raise HTTPException(status_code=400, detail="after_id must come before before_id")
+        return after["priority"], before["priority"]
+    if after:
+        following = await db.orders.find_one(
+            {**open_query, "$or": [
+                {"priority": {"$gt": after["priority"]}},
+                {"priority": after["priority"], "_id": {"$gt": after["_id"]}},
+            ]},
+            {"priority": 1}, sort=[("priority", 1), ("_id", 1)]
+        )
+        return after["priority"], following["priority"] if following else None
+    if before:
+        preceding = await db.orders.find_one(
+            {**open_query, "$or": [
+                {"priority": {"$lt": before["priority"]}},
+                {"priority": before["priority"], "_id": {"$lt": before["_id"]}},
+            ]},
+            {"priority": 1}, sort=[("priority", -1), ("_id", -1)]
         )
-    return {"message": "Orders reordered successfully"}
+        return preceding["priority"] if preceding else None, before["priority"]
+    raise HTTPException(status_code=400, detail="Provide after_id and/or before_id")
+
+# Helper moving one open order, writing only that order unless its gap is exhausted
+async def move_order(order_id: str, move: OrderMove, position: Optional[str] = None):
+    order = await db.orders.find_one({"_id": ObjectId(order_id)}, {"party_id": 1, "status": 1})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order["status"] not in OPEN_STATUSES:
+        raise HTTPException(status_code=400, detail="Only open orders can be moved")
+    
+    for attempt in range(2):
+        lo, hi = await move_bounds(order, move, position)
+        if hi is None:
+            # Moving to the end of the queue takes the next sequence value
+            priority = await claim_priorities(db, order["party_id"])
+            break
+        priority = key_between(lo, hi)
+        if priority is not None:
+            break
+        rebalanced(order["party_id"], await rebalance_open_orders(db, order["party_id"]))
+    else:
+        raise HTTPException(status_code=409, detail="Could not find room to place order")
+    
+    async with sync_clock.stamp(db) as seq:
+        updated_order = await db.orders.find_one_and_update(
+            {"_id": order["_id"]},
+            {"$set": {"priority": priority, "updated_at": datetime.utcnow(), "sync_seq": seq}},
+            return_document=ReturnDocument.AFTER
+        )
+    versions.bump("orders", ("orders", order["party_id"]))
+    event_broker.emit([make_event("orders", "updated", order["_id"], order["party_id"], {
+        "priority": priority, "updated_at": updated_order["updated_at"]
+    })])
+    if needs_rebalance(lo, hi, priority):
+        rebalance_later(order["party_id"])
+    return Order(**object_id_to_str(updated_order))
+
+@api_router.post("/orders/{order_id}/move", response_model=Order)
+async def move_order_between(order_id: str, move: OrderMove):
+    """Move an open order between two others, writing only the moved order"""
+    return await move_order(order_id, move)
+
+@api_router.post("/orders/{order_id}/move-to-top", response_model=Order)
+async def move_order_to_top(order_id: str):
+    return await move_order(order_id, OrderMove(), "top")
+
+@api_router.post("/orders/{order_id}/move-to-bottom", response_model=Order)
+async def move_order_to_bottom(order_id: str):
+    return await move_order(order_id, OrderMove(), "bottom")
 
 
 # Material Transactions Routes
-@api_router.get("/material-transactions", response_model=List[MaterialTransaction])
-async def get_material_transactions(party_id: Optional[str] = None):
+@api_router.get("/material-transactions", response_model=Page[MaterialTransaction])
+async def get_material_transactions(
+    request: Request,
+    response: Response,
+    party_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    selected = requested_fields(MaterialTransaction, fields)
+    conditional_get(request, response, ("material_transactions", party_id) if party_id else "material_transactions")
+    
     query = {}
     if party_id:
         query["party_id"] = party_id
     
-    transactions = await db.material_transactions.find(query).sort("created_at", -1).to_list(1000)
-    return [MaterialTransaction(**object_id_to_str(t)) for t in transactions]
+    transactions, next_cursor = await fetch_page(
+        db.material_transactions, query, "created_at", DESCENDING, limit, cursor,
+        read_projection(MaterialTransaction, selected, "created_at")
+    )
+    return respond(response, build_page(MaterialTransaction, transactions, next_cursor, selected))
 
 
 # Financial Transactions Routes
 @api_router.post("/financial-transactions", response_model=FinancialTransaction)
-async def create_financial_transaction(transaction: FinancialTransactionCreate):
+async def create_financial_transaction(
+    transaction: FinancialTransactionCreate, idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotent(
+        "financial_transactions", idempotency_key, transaction, FinancialTransaction,
+        lambda tag: record_financial_transaction(transaction, tag)
+    )
+
+async def record_financial_transaction(
+    transaction: FinancialTransactionCreate, idempotency_tag: Optional[str] = None
+) -> FinancialTransaction:
     # Get party details
-    party = await db.parties.find_one({"_id": ObjectId(transaction.party_id)})
+    party = await get_party_meta(transaction.party_id)
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
     transaction_dict = transaction.dict()
     transaction_dict["party_name"] = party["name"]
     transaction_dict["created_at"] = datetime.utcnow()
+    if idempotency_tag:
+        transaction_dict["idempotency_key"] = idempotency_tag
     
-    result = await db.financial_transactions.insert_one(transaction_dict)
-    transaction_dict["id"] = str(result.inserted_id)
-    
-    # Update party balance
     # Payment: party pays us, reduces their balance (they owe less)
     # Receipt: we pay party, increases their balance (we owe more)
     balance_change = -transaction.amount if transaction.payment_type == "payment" else transaction.amount
-    await db.parties.update_one(
-        {"_id": ObjectId(transaction.party_id)},
-        {"$inc": {"balance": balance_change}}
+    async with sync_clock.stamp(db, 2) as seq:
+        transaction_dict["sync_seq"] = seq
+        result = await db.financial_transactions.insert_one(transaction_dict)
+        transaction_dict["id"] = str(result.inserted_id)
+        
+        # Update party balance
+        await db.parties.update_one(
+            {"_id": ObjectId(transaction.party_id)},
+            {"$inc": {"balance": balance_change}, "$set": {"sync_seq": seq + 1}}
+        )
+    versions.bump(
+        "financial_transactions", ("financial_transactions", transaction.party_id),
+        "parties", ("parties", transaction.party_id)
     )
+    event_broker.emit([make_event(
+        "financial_transactions", "created", transaction_dict["id"], transaction.party_id, transaction_dict
+    )])
     
     return FinancialTransaction(**transaction_dict)
 
-@api_router.get("/financial-transactions", response_model=List[FinancialTransaction])
-async def get_financial_transactions(party_id: Optional[str] = None):
+@api_router.get("/financial-transactions", response_model=Page[FinancialTransaction])
+async def get_financial_transactions(
+    request: Request,
+    response: Response,
+    party_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    selected = requested_fields(FinancialTransaction, fields)
+    conditional_get(request, response, ("financial_transactions", party_id) if party_id else "financial_transactions")
+    
+    query = {}
+    if party_id:
+        query["party_id"] = party_id
+    
+    transactions, next_cursor = await fetch_page(
+        db.financial_transactions, query, "created_at", DESCENDING, limit, cursor,
+        read_projection(FinancialTransaction, selected, "created_at")
+    )
+    return respond(response, build_page(FinancialTransaction, transactions, next_cursor, selected))
+
+
+# Export Routes
+@api_router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = "ndjson",
+    party_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    gzip: bool = False,
+):
+    """Stream a full export of orders or a ledger as NDJSON or CSV"""
+    if collection not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Unknown export collection")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+    
     query = {}
     if party_id:
         query["party_id"] = party_id
+    created_at = {}
+    if start_date:
+        created_at["$gte"] = start_date
+    if end_date:
+        created_at["$lte"] = end_date
+    if created_at:
+        query["created_at"] = created_at
+    
+    cursor = (
+        db[collection].find(query, PROJECTIONS[EXPORT_MODELS[collection]])
+        .sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+        .batch_size(CURSOR_BATCH_SIZE)
+    )
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{collection}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        export_stream(cursor, collection, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# Stock Routes
+@api_router.get("/stock", response_model=Page[StockLevel])
+async def get_stock_levels(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    """Current stock levels of every product that has been ordered"""
+    selected = requested_fields(StockLevel, fields)
+    conditional_get(request, response, "stock")
+    levels, next_cursor = await fetch_page(
+        db.stock, {}, None, ASCENDING, limit, cursor, read_projection(StockLevel, selected)
+    )
+    return respond(response, build_page(StockLevel, levels, next_cursor, selected))
+
+@api_router.get("/stock/{product_id}", response_model=StockLevel)
+async def get_stock_level(
+    product_id: str, request: Request, response: Response, fields: Optional[str] = None
+):
+    selected = requested_fields(StockLevel, fields)
+    conditional_get(request, response, "stock")
+    level = await db.stock.find_one({"_id": product_id}, read_projection(StockLevel, selected))
+    if not level:
+        # Never ordered: zero stock if the product exists
+        try:
+            product = await db.products.find_one({"_id": ObjectId(product_id)}, {"name": 1})
+        except InvalidId:
+            product = None
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        zero = {"quantity": 0.0, "weight": 0.0}
+        level = {
+            "_id": product_id, "product_name": product["name"],
+            "on_hand": zero, "incoming": zero, "reserved": zero,
+        }
+    return respond(response, build_item(StockLevel, level, selected))
+
+@api_router.get("/stock/{product_id}/history", response_model=Page[StockMovement])
+async def get_stock_history(
+    product_id: str,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    """Stock movements of a product, newest first"""
+    selected = requested_fields(StockMovement, fields)
+    conditional_get(request, response, "stock")
+    movements, next_cursor = await fetch_page(
+        db.stock_movements, {"product_id": product_id}, "created_at", DESCENDING,
+        limit, cursor, read_projection(StockMovement, selected, "created_at")
+    )
+    return respond(response, build_page(StockMovement, movements, next_cursor, selected))
+
+
+# Sync Routes
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync_changes(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_SYNC_LIMIT, ge=1, le=MAX_SYNC_LIMIT),
+):
+    """Documents changed and deleted since the token of the previous sync.
+
+    Without a token this is a full sync. Keep calling with the returned
+    token while has_more is true.
+    """
+    seq, reset = 0, False
+    if since:
+        try:
+            seq, issued_at = decode_sync_token(since)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        # Tombstones older than this are gone, so deletes could be missed
+        if datetime.utcnow() - issued_at > TOMBSTONE_RETENTION:
+            seq, reset = 0, True
+    
+    watermark = await sync_clock.watermark(db)
+    found, token_seq, has_more = await changes_since(
+        db, seq, watermark, limit,
+        {name: PROJECTIONS[model] for name, model in SYNC_MODELS.items()}
+    )
+    changes = {name: [] for name in SYNC_MODELS}
+    deleted = {name: [] for name in SYNC_MODELS}
+    for name, doc in found:
+        if name == "tombstones":
+            deleted[doc["collection"]].append(doc["doc_id"])
+        else:
+            out = to_fast_doc(doc, SHAPES[SYNC_MODELS[name]])
+            del out["sync_seq"]
+            changes[name].append(out)
+    return FastJSONResponse({
+        "token": encode_sync_token(token_seq, datetime.utcnow()),
+        "has_more": has_more,
+        "reset": reset,
+        "changes": changes,
+        "deleted": deleted,
+    })
+
+
+@api_router.get("/stream")
+async def stream_events(party_id: Optional[str] = None):
+    """Server-sent events for order and ledger changes, of one party or all.
+
+    Events: order.created, order.updated (status, priority or totals),
+    material_transaction.created, financial_transaction.created, and overflow
+    when the client fell too far behind and was disconnected. Nothing is
+    replayed on reconnect; catch up through /sync.
+    """
+    return StreamingResponse(
+        sse_frames(event_broker, party_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Reports Routes
+@api_router.get("/reports/summary", response_model=ReportSummary)
+async def get_report_summary(
+    request: Request,
+    response: Response,
+    period: str = "month",
+    group_by: str = "party",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    party_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    order_type: Optional[str] = None,
+):
+    """Sales and purchase totals from the daily/monthly rollups"""
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail="Period must be day or month")
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY)}")
+    # Rollups only change with orders
+    conditional_get(request, response, "orders")
     
-    transactions = await db.financial_transactions.find(query).sort("created_at", -1).to_list(1000)
-    return [FinancialTransaction(**object_id_to_str(t)) for t in transactions]
+    rows = await summarize(
+        db, period, group_by, start_date, end_date, party_id, product_id, order_type
+    )
+    return ReportSummary(
+        period=period,
+        group_by=group_by,
+        start_date=start_date,
+        end_date=end_date,
+        rows=[ReportRow(**row) for row in rows],
+    )
+
+
+# Admin Routes
+@api_router.post("/admin/rollups/rebuild")
+async def rebuild_report_rollups():
+    """Regenerate the report rollups from the orders"""
+    count = await rebuild_rollups(db)
+    versions.bump("orders")
+    return {"message": "Rollups rebuilt", "rollups": count}
+
+
+@api_router.post("/admin/stock/recompute")
+async def recompute_stock_levels():
+    """Rebuild stock levels from the orders"""
+    count = await recompute_stock(db)
+    versions.bump("stock")
+    return {"message": "Stock recomputed", "products": count}
+
+
+# Reconciliation runs in progress, by run id
+reconcile_tasks: Dict[str, asyncio.Task] = {}
+
+async def run_reconcile(run: dict, concurrency: int):
+    run_id = str(run["_id"])
+    try:
+        await reconcile_balances(
+            db, run, concurrency,
+            on_fixed=lambda party_ids: versions.bump("parties", *(("parties", pid) for pid in party_ids))
+        )
+    except Exception:
+        logger.exception("Reconciliation %s failed", run_id)
+    finally:
+        reconcile_tasks.pop(run_id, None)
+
+@api_router.post("/admin/reconcile", status_code=202)
+async def start_reconcile(
+    fix: bool = False,
+    chunk_size: int = Query(CHUNK_SIZE, ge=1, le=10000),
+    concurrency: int = Query(CONCURRENCY, ge=1, le=32),
+    resume: Optional[str] = None,
+):
+    """Check party balances against the ledgers in the background; fix=true repairs drift.
+
+    resume=<run_id> continues an interrupted run from its checkpoint.
+    """
+    if resume:
+        if resume in reconcile_tasks:
+            raise HTTPException(status_code=409, detail="Run is still in progress")
+        try:
+            run = await resume_run(db, ObjectId(resume))
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid run id")
+        if run is None:
+            raise HTTPException(status_code=404, detail="No unfinished run with this id")
+    else:
+        run = await start_run(db, fix, chunk_size)
+    run_id = str(run["_id"])
+    reconcile_tasks[run_id] = asyncio.create_task(run_reconcile(run, concurrency))
+    return {"message": "Reconciliation started", "run_id": run_id}
+
+
+@api_router.get("/admin/reconcile/{run_id}")
+async def get_reconcile_run(
+    run_id: str,
+    status: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Progress of a reconciliation run and a page of the parties it found drifted"""
+    try:
+        run_oid = ObjectId(run_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid run id")
+    run = await db.reconcile_runs.find_one({"_id": run_oid})
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    query = {"run_id": run_oid}
+    if status:
+        query["status"] = status
+    drift, next_cursor = await fetch_page(
+        db.reconcile_drift, query, None, ASCENDING, limit, cursor, {"run_id": 0}
+    )
+    run["checkpoint"] = str(run["checkpoint"]) if run["checkpoint"] else None
+    return FastJSONResponse({
+        "run": to_fast_doc(run),
+        "drift": {"items": [to_fast_doc(d) for d in drift], "next_cursor": next_cursor},
+    })
+
+
+@api_router.get("/admin/index-report")
+async def get_index_report():
+    """Explain the canonical queries and list any not served by an index"""
+    report = await explain_queries(db)
+    return {
+        "queries": report,
+        "uncovered": [q["name"] for q in report if not q["covered"]],
+    }
+
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats():
+    return {
+        "products": product_cache.stats(),
+        "party_meta": party_meta_cache.stats(),
+        "search": search_cache.stats(),
+        "party_search": party_search_cache.stats(),
+        "idempotency": idempotency.cache.stats(),
+    }
+
+
+@api_router.get("/_health")
+async def get_health():
+    try:
+        latency = await ping_latency_ms(client)
+    except Exception as e:
+        logger.warning("MongoDB ping failed: %s", e)
+        return JSONResponse(status_code=503, content={"status": "unavailable", "error": str(e)})
+    return {"status": "ok", "ping_ms": round(latency, 3), "pools": pool_monitor.snapshot()}
+
+@api_router.get("/_pool")
+async def get_pool():
+    return {"settings": mongo_settings.describe(), "pools": pool_monitor.snapshot()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 
 # Include the router in the main app
@@ -367,15 +1797,24 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
+)
+
+# Negotiated gzip/brotli for responses above the threshold
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(
+        RequestMetricsMiddleware, registry=metrics_registry,
+        streaming_routes=("/api/stream", "/api/export/{collection}"),
+    )
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
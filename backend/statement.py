@@ -0,0 +1,148 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pagination import decode_token, encode_token
+
+
+# Signed effect of a ledger row on the party balance, matching the $inc
+# applied by create_order and create_financial_transaction
+MATERIAL_BALANCE_CHANGE = "$amount"
+FINANCIAL_BALANCE_CHANGE = {
+    "$cond": [
+        {"$eq": ["$payment_type", "payment"]},
+        {"$multiply": ["$amount", -1]},
+        "$amount",
+    ]
+}
+
+STATEMENT_SORT = {"created_at": 1, "_id": 1}
+
+
+def _ledger_match(party_id: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    match = {"party_id": party_id}
+    created_at = {}
+    if start:
+        created_at["$gte"] = start
+    if end:
+        created_at["$lte"] = end
+    if created_at:
+        match["created_at"] = created_at
+    return match
+
+
+def _after(match: dict, created_at: datetime, last_id) -> dict:
+    return {
+        "$and": [
+            match,
+            {"$or": [
+                {"created_at": {"$gt": created_at}},
+                {"created_at": created_at, "_id": {"$gt": last_id}},
+            ]},
+        ]
+    }
+
+
+def statement_page_pipeline(match: dict, opening_balance: float, limit: int) -> List[dict]:
+    """Pipeline over material_transactions yielding one statement page.
+
+    Each branch is sorted and limited before the union so both collections
+    are read through their (party_id, created_at, _id) index and at most
+    ``limit`` rows come from each, however long the party's history is.
+    """
+    return [
+        {"$match": match},
+        {"$sort": STATEMENT_SORT},
+        {"$limit": limit},
+        {"$project": {
+            "source": {"$literal": "material"},
+            "order_id": 1,
+            "order_type": 1,
+            "description": 1,
+            "amount": 1,
+            "balance_change": MATERIAL_BALANCE_CHANGE,
+            "created_at": 1,
+        }},
+        {"$unionWith": {
+            "coll": "financial_transactions",
+            "pipeline": [
+                {"$match": match},
+                {"$sort": STATEMENT_SORT},
+                {"$limit": limit},
+                {"$project": {
+                    "source": {"$literal": "financial"},
+                    "payment_type": 1,
+                    "payment_method": 1,
+                    "description": 1,
+                    "amount": 1,
+                    "balance_change": FINANCIAL_BALANCE_CHANGE,
+                    "created_at": 1,
+                }},
+            ],
+        }},
+        {"$sort": STATEMENT_SORT},
+        {"$limit": limit},
+        {"$setWindowFields": {
+            "sortBy": STATEMENT_SORT,
+            "output": {
+                "running_balance": {
+                    "$sum": "$balance_change",
+                    "window": {"documents": ["unbounded", "current"]},
+                },
+            },
+        }},
+        {"$set": {"running_balance": {"$add": ["$running_balance", opening_balance]}}},
+    ]
+
+
+def opening_balance_pipeline(party_id: str, before: datetime) -> List[dict]:
+    match = {"party_id": party_id, "created_at": {"$lt": before}}
+    return [
+        {"$match": match},
+        {"$group": {"_id": None, "total": {"$sum": MATERIAL_BALANCE_CHANGE}}},
+        {"$unionWith": {
+            "coll": "financial_transactions",
+            "pipeline": [
+                {"$match": match},
+                {"$group": {"_id": None, "total": {"$sum": FINANCIAL_BALANCE_CHANGE}}},
+            ],
+        }},
+        {"$group": {"_id": None, "total": {"$sum": "$total"}}},
+    ]
+
+
+async def party_statement(
+    db,
+    party_id: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[float, List[dict], Optional[str]]:
+    """Return ``(opening_balance, entries, next_cursor)`` for one page.
+
+    The cursor carries the running balance after its last row, so later
+    pages never re-sum the history before them.
+    """
+    match = _ledger_match(party_id, start, end)
+
+    if cursor:
+        created_at, last_id, opening_balance = decode_token(cursor, 3)
+        match = _after(match, created_at, last_id)
+    elif start:
+        rows = await db.material_transactions.aggregate(
+            opening_balance_pipeline(party_id, start)
+        ).to_list(1)
+        opening_balance = rows[0]["total"] if rows else 0.0
+    else:
+        opening_balance = 0.0
+
+    entries = await db.material_transactions.aggregate(
+        statement_page_pipeline(match, opening_balance, limit + 1)
+    ).to_list(limit + 1)
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = encode_token([last["created_at"], last["_id"], last["running_balance"]])
+    return opening_balance, entries, next_cursor
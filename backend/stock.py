@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+
+
+# Stock per product in three levels, each a quantity and a weight:
+#   on_hand   completed purchases minus completed sales
+#   incoming  open purchase orders
+#   reserved  open sale orders
+# Levels live in the stock collection keyed by product id and change only
+# through $inc from the order handlers; every change is also appended to
+# stock_movements as history. recompute_stock rebuilds the levels from the
+# orders when they need correcting.
+# Orders of any other type don't move stock.
+LEVELS = ("on_hand", "incoming", "reserved")
+OPEN_LEVEL = {"purchase": "incoming", "sale": "reserved"}
+ON_HAND_SIGN = {"purchase": 1, "sale": -1}
+
+Moves = Dict[str, dict]
+
+
+def _accumulate(moves: Moves, lines: Iterable[dict], signs: Dict[str, int]):
+    for line in lines:
+        move = moves.get(line["product_id"])
+        if move is None:
+            move = moves[line["product_id"]] = {
+                "product_name": line["product_name"],
+                **{level: {"quantity": 0, "weight": 0} for level in LEVELS},
+            }
+        for level, sign in signs.items():
+            quantity = sign * line["quantity"]
+            move[level]["quantity"] += quantity
+            move[level]["weight"] += quantity * line["weight"]
+
+
+def created_moves(order: dict) -> Moves:
+    moves = {}
+    if order["order_type"] not in OPEN_LEVEL:
+        return moves
+    _accumulate(moves, order["products"], {OPEN_LEVEL[order["order_type"]]: 1})
+    return moves
+
+
+def edited_moves(order: dict, products: List[dict]) -> Moves:
+    moves = {}
+    if order["order_type"] not in OPEN_LEVEL:
+        return moves
+    level = OPEN_LEVEL[order["order_type"]]
+    _accumulate(moves, order["products"], {level: -1})
+    _accumulate(moves, products, {level: 1})
+    return moves
+
+
+def completed_moves(order: dict, products: List[dict]) -> Moves:
+    moves = {}
+    if order["order_type"] not in OPEN_LEVEL:
+        return moves
+    _accumulate(moves, products, {
+        OPEN_LEVEL[order["order_type"]]: -1,
+        "on_hand": ON_HAND_SIGN[order["order_type"]],
+    })
+    return moves
+
+
+async def record_stock(db, changes: Iterable[Tuple[dict, str, Moves]]):
+    """Apply ``(order, event, moves)`` changes to the stock levels and history.
+
+    Level increments are merged per product into one bulk write; history
+    keeps one movement per order and product.
+    """
+    now = datetime.utcnow()
+    levels = {}
+    history = []
+    for order, event, moves in changes:
+        for product_id, move in moves.items():
+            if not any(move[level]["quantity"] or move[level]["weight"] for level in LEVELS):
+                continue
+            # Every field is incremented, zeros included, so level documents
+            # always carry all of them
+            inc = levels.setdefault(product_id, {"product_name": move["product_name"], "inc": {}})["inc"]
+            for level in LEVELS:
+                for field in ("quantity", "weight"):
+                    key = f"{level}.{field}"
+                    inc[key] = inc.get(key, 0) + move[level][field]
+            history.append({
+                "product_id": product_id,
+                "product_name": move["product_name"],
+                "order_id": str(order["_id"]),
+                "party_id": order["party_id"],
+                "order_type": order["order_type"],
+                "event": event,
+                **{level: move[level] for level in LEVELS},
+                "created_at": now,
+            })
+    if not history:
+        return
+    await asyncio.gather(
+        db.stock.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": product_id},
+                    {"$inc": entry["inc"], "$set": {"product_name": entry["product_name"], "updated_at": now}},
+                    upsert=True
+                )
+                for product_id, entry in levels.items()
+            ],
+            ordered=False
+        ),
+        db.stock_movements.insert_many(history, ordered=False),
+    )
+
+
+def _level_sum(level: str, field: str) -> dict:
+    if level == "on_hand":
+        condition = {"$eq": ["$status", "completed"]}
+        sign = {"$cond": [{"$eq": ["$order_type", "purchase"]}, 1, -1]}
+    else:
+        order_type = "purchase" if level == "incoming" else "sale"
+        condition = {"$and": [{"$ne": ["$status", "completed"]}, {"$eq": ["$order_type", order_type]}]}
+        sign = 1
+    amount = "$products.quantity"
+    if field == "weight":
+        amount = {"$multiply": ["$products.quantity", "$products.weight"]}
+    return {"$sum": {"$cond": [condition, {"$multiply": [sign, amount]}, 0]}}
+
+
+RECOMPUTE_PIPELINE = [
+    {"$match": {"order_type": {"$in": list(OPEN_LEVEL)}}},
+    {"$unwind": "$products"},
+    {"$group": {
+        "_id": "$products.product_id",
+        "product_name": {"$last": "$products.product_name"},
+        **{
+            f"{level}_{field}": _level_sum(level, field)
+            for level in LEVELS for field in ("quantity", "weight")
+        },
+    }},
+    {"$project": {
+        "product_name": 1,
+        **{
+            level: {"quantity": f"${level}_quantity", "weight": f"${level}_weight"}
+            for level in LEVELS
+        },
+        "updated_at": "$$NOW",
+    }},
+    {"$out": "stock"},
+]
+
+
+async def recompute_stock(db) -> int:
+    """Rebuild every product's levels with one aggregation over orders.products.
+
+    History is left as it is. Orders written while this runs may be missed,
+    so run it when writes are quiet.
+    """
+    await db.orders.aggregate(RECOMPUTE_PIPELINE, allowDiskUse=True).to_list(None)
+    return await db.stock.count_documents({})
@@ -0,0 +1,170 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from pagination import InvalidCursor, decode_token, encode_token
+
+
+# Delta sync. Every write to a synced collection stamps the document with
+# sync_seq, a number from one global sequence; deletes leave a tombstone
+# stamped the same way. GET /sync?since=<token> returns whatever has a
+# sync_seq above the token's, up to the watermark: the highest value below
+# which every stamped write has finished. Clients apply the changes by id,
+# so a document sent twice is harmless.
+#
+# The sequence and the stamps still in flight both live on the counter
+# document, so every process writing to the database shares one watermark.
+SYNC_COLLECTIONS = ("products", "parties", "orders", "material_transactions", "financial_transactions")
+SYNC_COUNTER = "sync_seq"
+# A stamp still listed after this long belongs to a process that died; it
+# stops holding the watermark back
+STAMP_TIMEOUT = timedelta(seconds=60)
+# Tombstones expire after this long; older tokens get a full resync instead
+TOMBSTONE_RETENTION = timedelta(days=90)
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 5000
+
+
+class SyncClock:
+    """Hands out sync_seq values from the counters collection.
+
+    A stamp takes its values with a compare-and-set on the counter's seq
+    that also lists it under "inflight", and removes itself when its writes
+    are done; the watermark stops below the oldest stamp still listed.
+    Stamps from one process are serialized here, so the compare-and-set
+    only retries when another process stamped in between.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        # Last seq this process saw on the counter, the guess for the next swap
+        self._seq: Optional[int] = None
+
+    async def _reserve(self, db, count: int) -> int:
+        async with self._lock:
+            while True:
+                if self._seq is None:
+                    counter = await db.counters.find_one({"_id": SYNC_COUNTER}, {"seq": 1})
+                    self._seq = counter["seq"] if counter else 0
+                first = self._seq + 1
+                try:
+                    # Without a counter yet the upsert creates it; with a
+                    # different seq it collides on _id
+                    result = await db.counters.update_one(
+                        {"_id": SYNC_COUNTER, "seq": self._seq},
+                        {"$set": {"seq": self._seq + count},
+                         "$push": {"inflight": {"first": first, "expires_at": datetime.utcnow() + STAMP_TIMEOUT}}},
+                        upsert=True
+                    )
+                    swapped = result.modified_count or result.upserted_id is not None
+                except DuplicateKeyError:
+                    swapped = False
+                if swapped:
+                    self._seq += count
+                    return first
+                self._seq = None
+
+    @asynccontextmanager
+    async def stamp(self, db, count: int = 1):
+        """Reserve ``count`` consecutive values for the writes in the block."""
+        first = await self._reserve(db, count)
+        try:
+            yield first
+        finally:
+            await db.counters.update_one(
+                {"_id": SYNC_COUNTER}, {"$pull": {"inflight": {"first": first}}}
+            )
+
+    async def watermark(self, db) -> int:
+        counter = await db.counters.find_one({"_id": SYNC_COUNTER})
+        if counter is None:
+            return 0
+        now = datetime.utcnow()
+        inflight = counter.get("inflight", [])
+        live = [stamp["first"] for stamp in inflight if stamp["expires_at"] > now]
+        if len(live) < len(inflight):
+            await db.counters.update_one(
+                {"_id": SYNC_COUNTER}, {"$pull": {"inflight": {"expires_at": {"$lte": now}}}}
+            )
+        if live:
+            return min(live) - 1
+        return counter["seq"]
+
+
+sync_clock = SyncClock()
+
+
+def encode_sync_token(seq: int, issued_at: datetime) -> str:
+    return encode_token([seq, issued_at])
+
+
+def decode_sync_token(token: str) -> Tuple[int, datetime]:
+    seq, issued_at = decode_token(token, 2)
+    if not isinstance(seq, int) or not isinstance(issued_at, datetime):
+        raise InvalidCursor("Invalid sync token")
+    return seq, issued_at.replace(tzinfo=None)
+
+
+async def record_tombstone(db, collection: str, doc_id: str, seq: int):
+    await db.tombstones.insert_one({
+        "collection": collection,
+        "doc_id": doc_id,
+        "sync_seq": seq,
+        "deleted_at": datetime.utcnow(),
+    })
+
+
+async def changes_since(
+    db, since: int, watermark: int, limit: int, projections: Dict[str, dict]
+) -> Tuple[List[Tuple[str, dict]], int, bool]:
+    """Changed documents and tombstones with since < sync_seq <= watermark.
+
+    Returns ``(changes, token_seq, has_more)``: ``changes`` is a list of
+    ``(collection, doc)`` in sync_seq order, tombstones under "tombstones".
+    Nothing is queried when the token is already at the watermark.
+    """
+    if since >= watermark:
+        return [], watermark, False
+
+    query = {"sync_seq": {"$gt": since, "$lte": watermark}}
+    sources = {name: {**projections[name], "sync_seq": 1} for name in SYNC_COLLECTIONS}
+    if since > 0:
+        # A full sync starts from nothing, so it needs no tombstones
+        sources["tombstones"] = {"collection": 1, "doc_id": 1, "sync_seq": 1}
+    results = await asyncio.gather(*(
+        db[name].find(query, projection).sort("sync_seq", 1).limit(limit + 1).to_list(None)
+        for name, projection in sources.items()
+    ))
+
+    merged = sorted(
+        ((doc["sync_seq"], name, doc) for name, docs in zip(sources, results) for doc in docs),
+        key=lambda item: item[0]
+    )
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    token_seq = merged[-1][0] if has_more else watermark
+    return [(name, doc) for _, name, doc in merged], token_seq, has_more
+
+
+async def backfill_sync_seq(db, batch_size: int = 1000) -> int:
+    """Stamp documents written before delta sync existed."""
+    updated = 0
+    for name in SYNC_COLLECTIONS:
+        while True:
+            docs = await db[name].find(
+                {"sync_seq": {"$exists": False}}, {"_id": 1}
+            ).limit(batch_size).to_list(None)
+            if not docs:
+                break
+            async with sync_clock.stamp(db, len(docs)) as first:
+                await db[name].bulk_write(
+                    [UpdateOne({"_id": doc["_id"]}, {"$set": {"sync_seq": first + i}})
+                     for i, doc in enumerate(docs)],
+                    ordered=False
+                )
+            updated += len(docs)
+    return updated
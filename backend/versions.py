@@ -0,0 +1,48 @@
+import hashlib
+import uuid
+from collections import defaultdict
+from typing import Hashable
+
+
+class VersionRegistry:
+    """In-process version counters used to build ETags without touching Mongo.
+
+    Write handlers bump the scopes they change, e.g. ``"orders"`` and
+    ``("orders", party_id)``. Counters restart with the process, so every ETag
+    embeds a per-process epoch and an ETag from before a restart never matches.
+    Like the read caches, this assumes writes go through the same process.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions = defaultdict(int)
+
+    def bump(self, *scopes: Hashable):
+        for scope in scopes:
+            self._versions[scope] += 1
+
+    def version(self, scope: Hashable) -> int:
+        return self._versions[scope]
+
+    def etag(self, url: str, *scopes: Hashable) -> str:
+        # The URL (path and query) is part of the tag so different pages or
+        # filters over the same data never share an ETag
+        versions = ".".join(str(self._versions[scope]) for scope in scopes)
+        digest = hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
+        return f'W/"{self.epoch}-{versions}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on either side
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
@@ -35,12 +35,12 @@ class BackendTester:
             "details": details
         })
     
-    def make_request(self, method, endpoint, data=None, params=None):
+    def make_request(self, method, endpoint, data=None, params=None, headers=None):
         """Make HTTP request with error handling"""
         url = f"{self.base_url}{endpoint}"
         try:
             if method.upper() == "GET":
-                response = self.session.get(url, params=params)
+                response = self.session.get(url, params=params, headers=headers)
             elif method.upper() == "POST":
                 response = self.session.post(url, json=data)
             elif method.upper() == "PATCH":
@@ -69,7 +69,7 @@ class BackendTester:
             return False
         
         try:
-            products = response.json()
+            products = response.json()["items"]
             if not isinstance(products, list):
                 self.log_result("Products API", False, "Response is not a list")
                 return False
@@ -106,6 +106,36 @@ class BackendTester:
             self.log_result("Products API", False, "Invalid JSON response")
             return False
     
+    def test_conditional_get(self):
+        """Test that a matching If-None-Match on GET /api/products returns 304"""
+        print("\n=== Testing Conditional GET ===")
+        
+        response = self.make_request("GET", "/products")
+        if not response or response.status_code != 200:
+            self.log_result("Conditional GET", False, "Failed to get products")
+            return False
+        
+        etag = response.headers.get("ETag")
+        if not etag:
+            self.log_result("Conditional GET", False, "No ETag header on products list")
+            return False
+        
+        response = self.make_request("GET", "/products", headers={"If-None-Match": etag})
+        if not response:
+            self.log_result("Conditional GET", False, "Failed to connect to products endpoint")
+            return False
+        
+        if response.status_code != 304:
+            self.log_result("Conditional GET", False, f"Expected 304, got HTTP {response.status_code}")
+            return False
+        
+        if response.content:
+            self.log_result("Conditional GET", False, "304 response has a body")
+            return False
+        
+        self.log_result("Conditional GET", True, f"Matching ETag {etag} returned 304")
+        return True
+    
     def test_parties_api(self):
         """Test Parties API - should return Party P1 with balance 0"""
         print("\n=== Testing Parties API ===")
@@ -121,7 +151,7 @@ class BackendTester:
             return False
         
         try:
-            parties = response.json()
+            parties = response.json()["items"]
             if not isinstance(parties, list):
                 self.log_result("Parties API", False, "Response is not a list")
                 return False
@@ -171,7 +201,7 @@ class BackendTester:
                     "product_name": "X",
                     "quantity": 2.0,
                     "price": 100.0,
-                    "weight": 1.0
+                    "weight": 1.5
                 },
                 {
                     "product_id": self.product_ids['Y'],
@@ -205,7 +235,7 @@ class BackendTester:
             
             # Verify calculations
             expected_total_price = 2.0 * 100.0 + 1.0 * 150.0  # 350.0
-            expected_total_weight = 2.0 * 1.0 + 1.0 * 2.0     # 4.0
+            expected_total_weight = 2.0 * 1.5 + 1.0 * 2.0     # 5.0
             
             if order['total_price'] != expected_total_price:
                 self.log_result("Sale Order Creation", False, f"Wrong total_price: {order['total_price']}, expected {expected_total_price}")
@@ -246,7 +276,7 @@ class BackendTester:
             return False
         
         try:
-            transactions = response.json()
+            transactions = response.json()["items"]
             if not isinstance(transactions, list):
                 self.log_result("Material Transaction Auto-Creation", False, "Response is not a list")
                 return False
@@ -379,8 +409,8 @@ class BackendTester:
                     "product_id": self.product_ids['Z'],
                     "product_name": "Z",
                     "quantity": 3.0,
-                    "price": 80.0,
-                    "weight": 1.5
+                    "price": 200.0,
+                    "weight": 2.5
                 }
             ]
         }
@@ -398,7 +428,7 @@ class BackendTester:
             order = response.json()
             
             # Verify order type and calculations
-            expected_total_price = 3.0 * 80.0  # 240.0
+            expected_total_price = 3.0 * 200.0  # 600.0
             
             if order['order_type'] != 'purchase':
                 self.log_result("Purchase Order Creation", False, f"Wrong order_type: {order['order_type']}")
@@ -431,7 +461,7 @@ class BackendTester:
             return False
         
         try:
-            transactions = response.json()
+            transactions = response.json()["items"]
             
             # Look for purchase transaction with negative amount
             purchase_transaction = None
@@ -444,8 +474,8 @@ class BackendTester:
                 self.log_result("Purchase Material Transaction", False, "No negative purchase material transaction found")
                 return False
             
-            # Verify amount is negative (-240.0 from purchase order)
-            expected_amount = -240.0
+            # Verify amount is negative (-600.0 from purchase order)
+            expected_amount = -600.0
             if purchase_transaction['amount'] != expected_amount:
                 self.log_result("Purchase Material Transaction", False, f"Wrong amount: {purchase_transaction['amount']}, expected {expected_amount}")
                 return False
@@ -465,8 +495,14 @@ class BackendTester:
             self.log_result("Order Reordering", False, "Need at least 2 orders for reordering test")
             return False
         
-        # Reorder the orders (reverse the current order)
-        reorder_data = list(reversed(self.order_ids))
+        # The first order was completed above, so it can't be reordered
+        response = self.make_request("POST", "/orders/reorder", list(reversed(self.order_ids)))
+        if not response or response.status_code != 400:
+            self.log_result("Order Reordering", False, "Completed order was accepted for reordering")
+            return False
+        
+        # Reorder the open orders (reverse the current order)
+        reorder_data = list(reversed(self.order_ids[1:]))
         
         response = self.make_request("POST", "/orders/reorder", reorder_data)
         if not response:
@@ -533,7 +569,7 @@ class BackendTester:
             return False
         
         try:
-            transactions = response.json()
+            transactions = response.json()["items"]
             if len(transactions) < 2:
                 self.log_result("Financial Transactions", False, f"Expected at least 2 transactions, got {len(transactions)}")
                 return False
@@ -565,10 +601,10 @@ class BackendTester:
             # Expected balance calculation:
             # Initial: 0
             # Sale order: +350 (material transaction)
-            # Purchase order: -240 (material transaction)  
+            # Purchase order: -600 (material transaction)  
             # Payment: +100 (financial transaction - payment decreases what party owes, so increases balance)
             # Receipt: -50 (financial transaction - receipt decreases balance)
-            # Expected: 0 + 350 - 240 + 100 - 50 = 160
+            # Expected: 0 + 350 - 600 + 100 - 50 = -200
             
             current_balance = party.get('balance', 0)
             self.log_result("Final Party Balance", True, f"Final party balance: {current_balance}")
@@ -586,6 +622,7 @@ class BackendTester:
         
         tests = [
             self.test_products_api,
+            self.test_conditional_get,
             self.test_parties_api,
             self.test_create_sale_order,
             self.test_material_transaction_auto_creation,
@@ -23,9 +23,9 @@ export default function PartyDetailScreen() {
   const router = useRouter();
   const partyId = params.id as string;
   
-  const { getParty } = usePartyStore();
+  const { getPartyOverview } = usePartyStore();
   const { orders, fetchOrders, updateOrder, reorderOrders } = useOrderStore();
-  const { materialTransactions, financialTransactions, fetchMaterialTransactions, fetchFinancialTransactions } = useTransactionStore();
+  const { materialTransactions, financialTransactions } = useTransactionStore();
   
   const [party, setParty] = useState<any>(null);
   const [activeTab, setActiveTab] = useState<TabType>('orders');
@@ -42,13 +42,15 @@ export default function PartyDetailScreen() {
   const loadData = async () => {
     setLoading(true);
     try {
-      const partyData = await getParty(partyId);
-      setParty(partyData);
-      await Promise.all([
-        fetchOrders(partyId),
-        fetchMaterialTransactions(partyId),
-        fetchFinancialTransactions(partyId),
-      ]);
+      const overview = await getPartyOverview(partyId);
+      if (overview) {
+        setParty(overview.party);
+        useOrderStore.setState({ orders: overview.orders.items });
+        useTransactionStore.setState({
+          materialTransactions: overview.material_transactions.items,
+          financialTransactions: overview.financial_transactions.items,
+        });
+      }
     } catch (error) {
       console.error('Error loading data:', error);
     } finally {
@@ -1,5 +1,6 @@
 import { create } from 'zustand';
 import axios from 'axios';
+import { fetchAllPages } from './pagination';
 
 const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
@@ -44,14 +45,11 @@ export const useOrderStore = create<OrderStore>((set, get) => ({
   fetchOrders: async (partyId?: string, orderType?: string) => {
     set({ loading: true, error: null });
     try {
-      let url = `${API_URL}/api/orders`;
-      const params = [];
-      if (partyId) params.push(`party_id=${partyId}`);
-      if (orderType) params.push(`order_type=${orderType}`);
-      if (params.length > 0) url += `?${params.join('&')}`;
-      
-      const response = await axios.get(url);
-      set({ orders: response.data, loading: false });
+      const orders = await fetchAllPages<Order>(`${API_URL}/api/orders`, {
+        party_id: partyId,
+        order_type: orderType,
+      });
+      set({ orders, loading: false });
     } catch (error: any) {
       set({ error: error.message, loading: false });
     }
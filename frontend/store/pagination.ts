@@ -0,0 +1,36 @@
+import axios from 'axios';
+
+// Largest page the list routes serve (pagination.MAX_PAGE_SIZE on the backend)
+const PAGE_SIZE = 1000;
+
+interface Page<T> {
+  items: T[];
+  next_cursor?: string | null;
+}
+
+// The items of a page already fetched, then every later page via next_cursor
+export async function fetchRemainingPages<T>(
+  url: string,
+  params: Record<string, string | undefined>,
+  page: Page<T>
+): Promise<T[]> {
+  const items = [...page.items];
+  let cursor = page.next_cursor;
+  while (cursor) {
+    const response = await axios.get<Page<T>>(url, {
+      params: { ...params, limit: PAGE_SIZE, cursor },
+    });
+    items.push(...response.data.items);
+    cursor = response.data.next_cursor;
+  }
+  return items;
+}
+
+// Every item of a list route, a page at a time
+export async function fetchAllPages<T>(
+  url: string,
+  params: Record<string, string | undefined> = {}
+): Promise<T[]> {
+  const response = await axios.get<Page<T>>(url, { params: { ...params, limit: PAGE_SIZE } });
+  return fetchRemainingPages(url, params, response.data);
+}
@@ -1,5 +1,6 @@
 import { create } from 'zustand';
 import axios from 'axios';
+import { fetchAllPages, fetchRemainingPages } from './pagination';
 
 const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
@@ -18,6 +19,7 @@ interface PartyStore {
   fetchParties: () => Promise<void>;
   createParty: (party: { name: string; contact?: string }) => Promise<void>;
   getParty: (id: string) => Promise<Party | null>;
+  getPartyOverview: (id: string) => Promise<any | null>;
 }
 
 export const usePartyStore = create<PartyStore>((set, get) => ({
@@ -28,8 +30,8 @@ export const usePartyStore = create<PartyStore>((set, get) => ({
   fetchParties: async () => {
     set({ loading: true, error: null });
     try {
-      const response = await axios.get(`${API_URL}/api/parties`);
-      set({ parties: response.data, loading: false });
+      const parties = await fetchAllPages<Party>(`${API_URL}/api/parties`);
+      set({ parties, loading: false });
     } catch (error: any) {
       set({ error: error.message, loading: false });
     }
@@ -54,4 +56,25 @@ export const usePartyStore = create<PartyStore>((set, get) => ({
       return null;
     }
   },
+
+  getPartyOverview: async (id: string) => {
+    try {
+      const response = await axios.get(`${API_URL}/api/parties/${id}/overview`);
+      const overview = response.data;
+      // The overview holds the first page of each list; load the rest
+      const params = { party_id: id };
+      const [orders, materialTransactions, financialTransactions] = await Promise.all([
+        fetchRemainingPages(`${API_URL}/api/orders`, params, overview.orders),
+        fetchRemainingPages(`${API_URL}/api/material-transactions`, params, overview.material_transactions),
+        fetchRemainingPages(`${API_URL}/api/financial-transactions`, params, overview.financial_transactions),
+      ]);
+      overview.orders = { items: orders, next_cursor: null };
+      overview.material_transactions = { items: materialTransactions, next_cursor: null };
+      overview.financial_transactions = { items: financialTransactions, next_cursor: null };
+      return overview;
+    } catch (error: any) {
+      set({ error: error.message });
+      return null;
+    }
+  },
 }));
@@ -1,5 +1,6 @@
 import { create } from 'zustand';
 import axios from 'axios';
+import { fetchAllPages } from './pagination';
 
 const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
@@ -27,8 +28,8 @@ export const useProductStore = create<ProductStore>((set) => ({
   fetchProducts: async () => {
     set({ loading: true, error: null });
     try {
-      const response = await axios.get(`${API_URL}/api/products`);
-      set({ products: response.data, loading: false });
+      const products = await fetchAllPages<Product>(`${API_URL}/api/products`);
+      set({ products, loading: false });
     } catch (error: any) {
       set({ error: error.message, loading: false });
     }
@@ -46,8 +47,8 @@ export const useProductStore = create<ProductStore>((set) => ({
         await axios.post(`${API_URL}/api/products`, product);
       }
       // Refresh the list
-      const response = await axios.get(`${API_URL}/api/products`);
-      set({ products: response.data });
+      const products = await fetchAllPages<Product>(`${API_URL}/api/products`);
+      set({ products });
     } catch (error: any) {
       set({ error: error.message });
     }
@@ -1,5 +1,6 @@
 import { create } from 'zustand';
 import axios from 'axios';
+import { fetchAllPages } from './pagination';
 
 const API_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
@@ -44,11 +45,10 @@ export const useTransactionStore = create<TransactionStore>((set, get) => ({
   fetchMaterialTransactions: async (partyId?: string) => {
     set({ loading: true, error: null });
     try {
-      let url = `${API_URL}/api/material-transactions`;
-      if (partyId) url += `?party_id=${partyId}`;
-      
-      const response = await axios.get(url);
-      set({ materialTransactions: response.data, loading: false });
+      const materialTransactions = await fetchAllPages<MaterialTransaction>(
+        `${API_URL}/api/material-transactions`, { party_id: partyId }
+      );
+      set({ materialTransactions, loading: false });
     } catch (error: any) {
       set({ error: error.message, loading: false });
     }
@@ -57,11 +57,10 @@ export const useTransactionStore = create<TransactionStore>((set, get) => ({
   fetchFinancialTransactions: async (partyId?: string) => {
     set({ loading: true, error: null });
     try {
-      let url = `${API_URL}/api/financial-transactions`;
-      if (partyId) url += `?party_id=${partyId}`;
-      
-      const response = await axios.get(url);
-      set({ financialTransactions: response.data, loading: false });
+      const financialTransactions = await fetchAllPages<FinancialTransaction>(
+        `${API_URL}/api/financial-transactions`, { party_id: partyId }
+      );
+      set({ financialTransactions, loading: false });
     } catch (error: any) {
       set({ error: error.message, loading: false });
     }
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+import server as server_module  # noqa: E402
+from sync import sync_clock  # noqa: E402
+from versions import VersionRegistry  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test_database"]
+
+
+@pytest.fixture
+def server(db, monkeypatch):
+    """The app module wired to a fresh in-memory database, with empty caches."""
+    monkeypatch.setattr(server_module, "db", db)
+    monkeypatch.setattr(server_module, "versions", VersionRegistry())
+    for cache in (
+        server_module.product_cache, server_module.party_meta_cache,
+        server_module.search_cache, server_module.party_search_cache,
+        server_module.idempotency.cache,
+    ):
+        cache.clear()
+    monkeypatch.setattr(sync_clock, "_lock", asyncio.Lock())
+    monkeypatch.setattr(sync_clock, "_seq", None)
+    return server_module
+
+
+@pytest.fixture
+async def client(server):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -0,0 +1,48 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class UnreachableDB:
+    """Stands in for the database; any command sent to it fails the test."""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"304 path touched db.{name}")
+
+    def __getitem__(self, name):
+        raise AssertionError(f"304 path touched db[{name!r}]")
+
+
+@pytest.mark.parametrize("path", [
+    "/api/products",
+    "/api/parties",
+    "/api/orders",
+    "/api/parties/{party_id}",
+    "/api/parties/{party_id}/overview",
+    "/api/material-transactions?party_id={party_id}",
+])
+async def test_not_modified_sends_no_commands(server, client, monkeypatch, path):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    path = path.format(party_id=party["id"])
+    response = await client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    monkeypatch.setattr(server, "db", UnreachableDB())
+    response = await client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Without the ETag (and the product cache) the same route needs the database
+    server.product_cache.clear()
+    with pytest.raises(AssertionError):
+        await client.get(path)
+
+
+async def test_write_changes_the_etag(client):
+    response = await client.get("/api/parties")
+    etag = response.headers["ETag"]
+    await client.post("/api/parties", json={"name": "Ravi", "contact": ""})
+    response = await client.get("/api/parties", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from idempotency import PENDING_TIMEOUT
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_takeover_replays_what_the_dead_request_created(server, client, db, monkeypatch):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    body = {"party_id": party["id"], "order_type": "sale", "products": []}
+    headers = {"Idempotency-Key": "k1"}
+
+    # The order commits, then the request dies before storing its response
+    async def die(*args):
+        raise RuntimeError("connection lost")
+    with monkeypatch.context() as patch:
+        patch.setattr(server.idempotency, "complete", die)
+        with pytest.raises(RuntimeError):
+            await client.post("/api/orders", json=body, headers=headers)
+    server.idempotency.cache.clear()
+
+    # A retry before the timeout still waits for it
+    response = await client.post("/api/orders", json=body, headers=headers)
+    assert response.status_code == 409
+
+    await db.idempotency_keys.update_one(
+        {"_id": "orders:k1"}, {"$set": {"created_at": datetime.utcnow() - PENDING_TIMEOUT}}
+    )
+    response = await client.post("/api/orders", json=body, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert await db.orders.count_documents({}) == 1
+    order = await db.orders.find_one({})
+    assert response.json()["id"] == str(order["_id"])
+
+    claim = await db.idempotency_keys.find_one({"_id": "orders:k1"})
+    assert claim["response"]["id"] == response.json()["id"]
@@ -0,0 +1,41 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from metrics import MetricsRegistry, RequestMetricsMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+async def events():
+    yield b"event: ping\ndata: {}\n\n"
+
+
+app = FastAPI()
+
+
+@app.get("/api/stream")
+async def stream():
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/orders/{order_id}")
+async def get_order(order_id: str):
+    return PlainTextResponse("ok")
+
+
+async def test_streaming_routes_stay_out_of_the_latency_histogram():
+    registry = MetricsRegistry()
+    transport = httpx.ASGITransport(
+        app=RequestMetricsMiddleware(app, registry, streaming_routes=("/api/stream",))
+    )
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/api/stream")
+        await client.get("/api/orders/1")
+        await client.get("/api/orders/2")
+
+    rendered = registry.render()
+    assert 'http_requests_total{method="GET",route="/api/stream",status="200"} 1' in rendered
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/orders/{order_id}"} 2' in rendered
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/stream"}' not in rendered
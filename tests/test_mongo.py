@@ -0,0 +1,15 @@
+import pytest
+
+from mongo import MongoSettings
+
+
+def test_zlib_compression_is_passed_to_the_driver():
+    settings = MongoSettings(url="mongodb://localhost", db_name="test", compressors="zlib")
+    assert settings.client_kwargs()["compressors"] == "zlib"
+    assert "compressors" not in MongoSettings(url="mongodb://localhost", db_name="test").client_kwargs()
+
+
+@pytest.mark.parametrize("compressors", ["zstd", "snappy,zlib"])
+def test_compressors_without_installed_packages_are_rejected(compressors):
+    with pytest.raises(ValueError, match="Unsupported MONGO_COMPRESSORS"):
+        MongoSettings(url="mongodb://localhost", db_name="test", compressors=compressors)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def open_order(client):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    product = (await client.post(
+        "/api/products", json={"name": "Steel", "price": 120.0, "weight": 2.0}
+    )).json()
+    order = (await client.post("/api/orders", json={
+        "party_id": party["id"],
+        "order_type": "sale",
+        "products": [{"product_id": product["id"], "quantity": 1}],
+    })).json()
+    return order, product
+
+
+async def test_concurrent_edits_keep_rollups_in_step(server, client, db, open_order, monkeypatch):
+    order, product = open_order
+    price_order = server.price_order
+
+    async def slow_price_order(products):
+        # Let the other edits read the order before this one writes
+        await asyncio.sleep(0.01)
+        return await price_order(products)
+    monkeypatch.setattr(server, "price_order", slow_price_order)
+
+    responses = await asyncio.gather(*(
+        client.patch(f"/api/orders/{order['id']}", json={
+            "products": [{"product_id": product["id"], "quantity": quantity}]
+        })
+        for quantity in range(2, 22)
+    ))
+    assert all(r.status_code == 200 for r in responses)
+
+    final = await db.orders.find_one({})
+    quantity = final["products"][0]["quantity"]
+    rows = await db.rollups.find({"period": "day"}).to_list(None)
+    by_product = {row["product_id"]: row for row in rows}
+    assert by_product[product["id"]]["quantity"] == quantity
+    assert by_product[None]["quantity"] == quantity
+    assert by_product[None]["total_price"] == final["total_price"]
+    assert by_product[None]["count"] == 1
+
+
+async def test_concurrent_edits_and_completion_keep_stock_in_step(server, client, db, open_order, monkeypatch):
+    order, product = open_order
+    price_order = server.price_order
+
+    async def slow_price_order(products):
+        await asyncio.sleep(0.01)
+        return await price_order(products)
+    monkeypatch.setattr(server, "price_order", slow_price_order)
+
+    def edit(quantity, **extra):
+        return client.patch(f"/api/orders/{order['id']}", json={
+            "products": [{"product_id": product["id"], "quantity": quantity}], **extra
+        })
+    responses = await asyncio.gather(
+        *(edit(quantity) for quantity in range(2, 12)),
+        edit(12, status="completed"),
+        *(edit(quantity) for quantity in range(13, 22)),
+    )
+    assert {r.status_code for r in responses} <= {200, 400}
+
+    final = await db.orders.find_one({})
+    assert final["status"] == "completed"
+    level = await db.stock.find_one({"_id": product["id"]})
+    assert level["reserved"] == {"quantity": 0, "weight": 0}
+    assert level["on_hand"]["quantity"] == -final["products"][0]["quantity"]
@@ -0,0 +1,52 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def order_for(client):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    product = (await client.post(
+        "/api/products", json={"name": "Steel", "price": 120.0, "weight": 2.0}
+    )).json()
+
+    def order(**line):
+        return {
+            "party_id": party["id"],
+            "order_type": "sale",
+            "products": [{"product_id": product["id"], "quantity": 3, **line}],
+        }
+    return order
+
+
+async def test_default_mode_rejects_a_client_price(server, client, order_for):
+    assert server.PRICING_MODE == "check"
+    response = await client.post("/api/orders", json=order_for(price=1.0, weight=2.0))
+    assert response.status_code == 422
+    assert "price 1.0 differs from catalog 120.0" in response.json()["detail"]
+
+
+async def test_default_mode_fills_and_accepts_catalog_values(client, order_for):
+    response = await client.post("/api/orders", json=order_for())
+    assert response.status_code == 200
+    order = response.json()
+    assert order["products"][0]["product_name"] == "Steel"
+    assert order["total_price"] == 360.0
+    assert order["total_weight"] == 6.0
+
+    response = await client.post("/api/orders", json=order_for(price=120.0, weight=2.0))
+    assert response.status_code == 200
+
+
+async def test_unknown_product_is_rejected(client, order_for):
+    body = order_for()
+    body["products"][0]["product_id"] = "000000000000000000000000"
+    response = await client.post("/api/orders", json=body)
+    assert response.status_code == 422
+
+
+async def test_fill_mode_trusts_sent_values(server, client, order_for, monkeypatch):
+    monkeypatch.setattr(server, "PRICING_MODE", "fill")
+    response = await client.post("/api/orders", json=order_for(price=1.0))
+    assert response.status_code == 200
+    assert response.json()["total_price"] == 3.0
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from ordering import COMPLETED_PRIORITY, PRIORITY_CEILING
+from sequences import allocate_priorities
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_allocations_are_unique(db):
+    # Includes the race to create the party's counter
+    starts = await asyncio.gather(*(allocate_priorities(db, "p1", 2) for _ in range(300)))
+    values = [start + i for start in starts for i in range(2)]
+    assert len(set(values)) == len(values) == 600
+    assert min(values) == 0
+
+
+async def test_concurrent_order_creates_get_unique_priorities(server, client, db):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    order = {"party_id": party["id"], "order_type": "sale", "products": []}
+    responses = await asyncio.gather(*(client.post("/api/orders", json=order) for _ in range(200)))
+    assert all(r.status_code == 200 for r in responses)
+    priorities = [r.json()["priority"] for r in responses]
+    assert len(set(priorities)) == 200
+    stored = await db.orders.distinct("priority", {"party_id": party["id"]})
+    assert sorted(stored) == sorted(priorities)
+
+
+async def test_sequence_restarts_below_the_ceiling(server, client, db):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    order = {"party_id": party["id"], "order_type": "sale", "products": []}
+    first = [(await client.post("/api/orders", json=order)).json()["id"] for _ in range(3)]
+    # Steady writes have kept the background restart from ever winning
+    await db.counters.update_one(
+        {"_id": f"order_priority:{party['id']}"}, {"$set": {"seq": PRIORITY_CEILING - 5}}
+    )
+    responses = await asyncio.gather(*(client.post("/api/orders", json=order) for _ in range(50)))
+    assert all(r.status_code == 200 for r in responses)
+    priorities = [r.json()["priority"] for r in responses]
+    assert len(set(priorities)) == 50
+    assert max(priorities) < PRIORITY_CEILING
+
+    # The queue keeps its order across the restart, and completed orders stay last
+    await client.patch(f"/api/orders/{first[0]}", json={"status": "completed"})
+    later = (await client.post("/api/orders", json=order)).json()
+    queue = await db.orders.find({"party_id": party["id"]}).sort("priority", 1).to_list(None)
+    ids = [str(o["_id"]) for o in queue]
+    assert ids[:2] == first[1:]
+    assert ids[-2:] == [later["id"], first[0]]
+    assert queue[-1]["priority"] == COMPLETED_PRIORITY
+    assert queue[-2]["priority"] < PRIORITY_CEILING
+
+
+async def test_reorder_rejects_completed_orders(client, db):
+    party = (await client.post("/api/parties", json={"name": "Asha", "contact": ""})).json()
+    order = {"party_id": party["id"], "order_type": "sale", "products": []}
+    ids = [(await client.post("/api/orders", json=order)).json()["id"] for _ in range(3)]
+    await client.patch(f"/api/orders/{ids[0]}", json={"status": "completed"})
+
+    response = await client.post("/api/orders/reorder", json=ids[::-1])
+    assert response.status_code == 400
+    completed = await db.orders.find_one({"status": "completed"})
+    assert completed["priority"] == COMPLETED_PRIORITY
+
+    response = await client.post("/api/orders/reorder", json=ids[:0:-1])
+    assert response.status_code == 200
+    queue = await db.orders.find({"status": "start"}).sort("priority", 1).to_list(None)
+    assert [str(o["_id"]) for o in queue] == ids[:0:-1]
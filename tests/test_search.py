@@ -0,0 +1,36 @@
+import pytest
+
+import search
+
+pytestmark = pytest.mark.anyio
+
+
+class UnreachableDB:
+    def __getattr__(self, name):
+        raise AssertionError(f"cached search touched db.{name}")
+
+
+async def test_candidates_are_read_in_index_order(client, monkeypatch):
+    for name in ("Azad", "Ayaan", "Axel", "Aarav"):
+        await client.post("/api/parties", json={"name": name, "contact": ""})
+    monkeypatch.setattr(search, "CANDIDATE_LIMIT", 3)
+    response = await client.get("/api/parties/search", params={"q": "a"})
+    assert [p["name"] for p in response.json()] == ["Axel", "Aarav", "Ayaan"]
+
+
+async def test_party_search_is_cached_until_a_party_changes(server, client, db, monkeypatch):
+    await client.post("/api/parties", json={"name": "Ravi Sharma", "contact": ""})
+    first = (await client.get("/api/parties/search", params={"q": "sha"})).json()
+    assert [p["name"] for p in first] == ["Ravi Sharma"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(server, "db", UnreachableDB())
+        again = (await client.get("/api/parties/search", params={"q": "sha"})).json()
+    assert again == first
+
+    await client.post("/api/parties", json={"name": "Shanti", "contact": ""})
+    response = await client.get("/api/parties/search", params={"q": "sha"})
+    assert [p["name"] for p in response.json()] == ["Shanti", "Ravi Sharma"]
+    await client.delete(f"/api/parties/{first[0]['id']}")
+    response = await client.get("/api/parties/search", params={"q": "sha"})
+    assert [p["name"] for p in response.json()] == ["Shanti"]
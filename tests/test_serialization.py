@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+pytestmark = pytest.mark.anyio
+
+CREATED = datetime(2024, 5, 1, 12, 30)
+PARTY_ID = ObjectId()
+
+
+@pytest.fixture
+async def stored(db):
+    # Documents as older writes or other clients leave them: ints in float
+    # fields, defaulted fields missing
+    await db.products.insert_one({"name": "Steel", "price": 120, "weight": 2})
+    await db.parties.insert_one({"_id": PARTY_ID, "name": "Asha", "balance": 360, "created_at": CREATED})
+    await db.parties.insert_one({"name": "Ravi"})
+    await db.orders.insert_one({
+        "party_id": str(PARTY_ID), "party_name": "Asha", "order_type": "sale",
+        "products": [{
+            "product_id": "p1", "product_name": "Steel", "quantity": 3, "price": 120, "weight": 2,
+        }],
+        "total_price": 360, "total_weight": 6, "status": "start", "priority": 2,
+        "created_at": CREATED,
+    })
+    await db.financial_transactions.insert_one({
+        "party_id": str(PARTY_ID), "party_name": "Asha", "amount": 100,
+        "payment_type": "payment", "created_at": CREATED,
+    })
+    await db.stock.insert_one({"_id": "p1", "product_name": "Steel", "reserved": {"quantity": 3, "weight": 6}})
+
+
+def comparable(body):
+    # 100 == 100.0 in Python, so numbers are compared with their JSON type.
+    # Default factories stamp the current time, which differs between calls.
+    if isinstance(body, dict):
+        return {
+            key: "<now>" if key in ("created_at", "updated_at") and value != CREATED.isoformat()
+            else comparable(value)
+            for key, value in body.items()
+        }
+    if isinstance(body, list):
+        return [comparable(item) for item in body]
+    if isinstance(body, (int, float)):
+        return type(body).__name__, body
+    return body
+
+
+@pytest.mark.parametrize("path", [
+    "/api/products",
+    "/api/parties",
+    "/api/orders",
+    "/api/financial-transactions",
+    "/api/stock",
+    f"/api/parties/{PARTY_ID}/overview",
+    "/api/orders?fields=priority,total_price,updated_at",
+])
+async def test_fast_path_matches_the_model_path(server, client, stored, monkeypatch, path):
+    monkeypatch.setattr(server, "FAST_RESPONSES", False)
+    model = (await client.get(path)).json()
+    server.product_cache.clear()
+    monkeypatch.setattr(server, "FAST_RESPONSES", True)
+    fast = (await client.get(path)).json()
+    assert comparable(fast) == comparable(model)
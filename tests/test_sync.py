@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from sync import SYNC_COUNTER, SyncClock
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_watermark_waits_for_stamps_of_other_processes(db):
+    # Two clocks stand for two worker processes sharing the database
+    first, second = SyncClock(), SyncClock()
+    async with first.stamp(db) as slow:
+        async with second.stamp(db, 3) as fast:
+            assert fast == slow + 1
+        # The second process is done, but the first still holds slow
+        assert await second.watermark(db) == slow - 1
+        assert await first.watermark(db) == slow - 1
+    assert await second.watermark(db) == fast + 2
+
+
+async def test_clocks_never_hand_out_the_same_value(db):
+    clocks = [SyncClock() for _ in range(3)]
+    seen = []
+    for _ in range(4):
+        for clock in clocks:
+            async with clock.stamp(db, 2) as seq:
+                seen += [seq, seq + 1]
+    assert sorted(seen) == list(range(1, len(seen) + 1))
+
+
+async def test_expired_stamp_stops_holding_the_watermark(db):
+    clock = SyncClock()
+    async with clock.stamp(db):
+        pass
+    # A stamp left behind by a process that died
+    await db.counters.update_one(
+        {"_id": SYNC_COUNTER},
+        {"$inc": {"seq": 1},
+         "$push": {"inflight": {"first": 2, "expires_at": datetime.utcnow() - timedelta(seconds=1)}}}
+    )
+    assert await clock.watermark(db) == 2
+    counter = await db.counters.find_one({"_id": SYNC_COUNTER})
+    assert counter["inflight"] == []